@@ -0,0 +1,80 @@
+# coding=utf-8
+"""
+Denormalized relationship counters.
+
+Each counter lives under its own cache key, so reading it is O(1). Counters are computed from the graph the first
+time they are read and kept up to date afterwards by the signal receivers in ``social_network.models``. The
+``rebuildsocialcounters`` management command recomputes them and reports drift.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+COUNTER_TIMEOUT = getattr(settings, 'SOCIAL_NETWORK_COUNTER_TIMEOUT', 60 * 60 * 24)
+
+FOLLOWERS = 'followers'
+FOLLOWING = 'following'
+FRIENDS = 'friends'
+SOCIAL_GROUPS = 'social_groups'
+MEMBERS = 'members'
+
+
+def counter_key(obj, name, site_id):
+    return 'social_network:counter:%s:%s.%s:%s:%s' % (
+        site_id, obj._meta.app_label, obj._meta.model_name, obj.pk, name
+    )
+
+
+def _missed_key(key):
+    return key + ':missed'
+
+
+def get_counter(obj, name, site_id, compute):
+    """
+    Returns the value of the counter, calling ``compute`` to initialize it if it isn't cached.
+    """
+    key = counter_key(obj, name, site_id)
+    value = cache.get(key)
+    if value is None:
+        missed = cache.get(_missed_key(key))
+        value = compute()
+        # add() won't overwrite a value set by a concurrent update since we computed ours
+        cache.add(key, value, COUNTER_TIMEOUT)
+        if cache.get(_missed_key(key)) != missed:
+            # an update found no counter to apply to while computing, ours may not include it
+            cache.delete(key)
+    return value
+
+
+def peek_counter(obj, name, site_id):
+    """
+    Returns the cached value of the counter, or None if it isn't cached.
+    """
+    return cache.get(counter_key(obj, name, site_id))
+
+
+def set_counter(obj, name, site_id, value):
+    cache.set(counter_key(obj, name, site_id), value, COUNTER_TIMEOUT)
+
+
+def update_counter(obj, name, site_id, delta):
+    """
+    Adds delta to the counter. Counters which aren't cached are left alone, they will be computed on the next read;
+    the miss is recorded, so a read computing the counter meanwhile doesn't keep a value missing the update.
+    """
+    key = counter_key(obj, name, site_id)
+    try:
+        if delta >= 0:
+            cache.incr(key, delta)
+        else:
+            cache.decr(key, -delta)
+    except ValueError:
+        missed = _missed_key(key)
+        cache.add(missed, 0, COUNTER_TIMEOUT)
+        try:
+            cache.incr(missed)
+        except ValueError:
+            pass
+
+
+def reset_counter(obj, name, site_id):
+    cache.delete(counter_key(obj, name, site_id))
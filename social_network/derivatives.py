@@ -0,0 +1,170 @@
+# coding=utf-8
+"""
+Resized variants of the group and post images.
+
+Each variant of ``SOCIAL_NETWORK_IMAGE_DERIVATIVES`` is stored next to the original, under a name derived from the
+original's one (``<dir>/derivatives/<name>_<variant>.<ext>``). They are generated by a Celery task, queued when the
+image is saved or the first time a missing variant is asked for; until then the original url is served. Urls of the
+generated variants are cached, so templates don't hit the storage to find them.
+
+Variants are only generated when ``SOCIAL_NETWORK_GENERATE_DERIVATIVES`` is on, which needs a Celery worker, and PIL
+(Pillow); otherwise, and for variants in formats PIL can't write, the originals are served. Route the task to its
+own queue (``SOCIAL_NETWORK_IMAGE_QUEUE``) to keep image work on a dedicated pool of worker processes.
+"""
+import hashlib
+import os
+from cStringIO import StringIO
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+IMAGE_DERIVATIVES = getattr(settings, 'SOCIAL_NETWORK_IMAGE_DERIVATIVES', {
+    'thumb': {'size': (150, 150), 'crop': True, 'format': 'JPEG'},
+    'thumb_webp': {'size': (150, 150), 'crop': True, 'format': 'WEBP'},
+    'medium': {'size': (800, 800), 'crop': False, 'format': 'JPEG'},
+    'medium_webp': {'size': (800, 800), 'crop': False, 'format': 'WEBP'},
+})
+# off by default: generating variants needs a Celery worker (and broker)
+GENERATE_DERIVATIVES = getattr(settings, 'SOCIAL_NETWORK_GENERATE_DERIVATIVES', False)
+IMAGE_QUEUE = getattr(settings, 'SOCIAL_NETWORK_IMAGE_QUEUE', None)
+DERIVATIVE_URL_TIMEOUT = getattr(settings, 'SOCIAL_NETWORK_DERIVATIVE_URL_TIMEOUT', 60 * 60 * 24 * 30)
+DERIVATIVE_QUALITY = getattr(settings, 'SOCIAL_NETWORK_DERIVATIVE_QUALITY', 85)
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+
+
+def derivative_name(name, variant):
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, 'derivatives', '%s_%s.%s' % (
+        os.path.splitext(filename)[0], variant, EXTENSIONS[IMAGE_DERIVATIVES[variant]['format']]
+    ))
+
+
+def _url_key(name, variant):
+    return 'social_network:derivative:%s:%s' % (hashlib.sha1(name.encode('utf-8')).hexdigest(), variant)
+
+
+def _queued_key(name):
+    return 'social_network:derivatives_queued:%s' % hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+
+_supported = None
+
+
+def supported_variants():
+    """
+    The variants whose format the installed PIL can write (WEBP needs a PIL built with libwebp), none unless
+    SOCIAL_NETWORK_GENERATE_DERIVATIVES is on.
+    """
+    global _supported
+    if not GENERATE_DERIVATIVES:
+        return []
+    if _supported is None:
+        if Image is None:
+            _supported = []
+        else:
+            Image.init()
+            _supported = [variant for variant, options in IMAGE_DERIVATIVES.items() if options['format'] in Image.SAVE]
+    return _supported
+
+
+def queue_derivatives(name):
+    """
+    Queues the generation of the variants of the image, unless it was queued recently.
+    """
+    if not supported_variants() or not name:
+        return
+    if cache.add(_queued_key(name), True, 60 * 10):
+        from dispatch import run_task
+        from tasks import generate_image_derivatives
+        options = {'queue': IMAGE_QUEUE} if IMAGE_QUEUE else {}
+        run_task(generate_image_derivatives, (name,), **options)
+
+
+def ensure_derivatives(image):
+    """
+    Queues the generation of the variants of image (an ImageField value) if some of them are missing. Called when
+    an image is saved, so variants are usually ready by the time they are first displayed.
+    """
+    if not image or not supported_variants():
+        return
+    keys = [_url_key(image.name, variant) for variant in supported_variants()]
+    if len(cache.get_many(keys)) < len(keys):
+        queue_derivatives(image.name)
+
+
+def derivative_url(image, variant):
+    """
+    Returns the url of the variant of image (an ImageField value), or the url of the image itself while the variant
+    isn't there yet, or can't be generated. Returns None if there is no image.
+    """
+    if not image:
+        return None
+    if variant not in supported_variants():
+        return image.url
+    key = _url_key(image.name, variant)
+    url = cache.get(key)
+    if url is None:
+        if cache.get(_queued_key(image.name)):
+            # being generated, no need to look at the storage
+            return image.url
+        name = derivative_name(image.name, variant)
+        if image.storage.exists(name):
+            url = image.storage.url(name)
+            cache.set(key, url, DERIVATIVE_URL_TIMEOUT)
+        else:
+            queue_derivatives(image.name)
+            return image.url
+    return url
+
+
+def render_derivative(image, size, crop, format):
+    if crop:
+        image = ImageOps.fit(image, size, Image.ANTIALIAS)
+    else:
+        image = image.copy()
+        image.thumbnail(size, Image.ANTIALIAS)
+    if format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = StringIO()
+    image.save(buffer, format, quality=DERIVATIVE_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_derivatives(name, storage=default_storage):
+    """
+    Generates and stores every variant of the image, caching their urls. Variants whose format isn't supported by
+    the installed PIL are skipped; the original url is cached for the ones failing, so they aren't retried on every
+    save.
+    """
+    if Image is None or not storage.exists(name):
+        return
+    try:
+        with storage.open(name) as original:
+            image = Image.open(original)
+            image.load()
+    except IOError:
+        # not an image PIL can read, serve the original
+        cache.set_many(dict((_url_key(name, variant), storage.url(name)) for variant in supported_variants()),
+                       DERIVATIVE_URL_TIMEOUT)
+        return
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    for variant in supported_variants():
+        options = IMAGE_DERIVATIVES[variant]
+        try:
+            content = render_derivative(image, options['size'], options.get('crop', False), options['format'])
+        except (IOError, KeyError):
+            cache.set(_url_key(name, variant), storage.url(name), DERIVATIVE_URL_TIMEOUT)
+            continue
+        target = derivative_name(name, variant)
+        if storage.exists(target):
+            storage.delete(target)
+        target = storage.save(target, content)
+        cache.set(_url_key(name, variant), storage.url(target), DERIVATIVE_URL_TIMEOUT)
@@ -0,0 +1,133 @@
+# coding=utf-8
+"""
+Dispatching of the social network signals.
+
+By default signals are sent synchronously, as Django does. When ``SOCIAL_NETWORK_ASYNC_SIGNALS`` is on, the signal
+and its arguments (model instances serialized by pk) are handed to a Celery task instead, which loads the instances
+back and sends the signal from a worker.
+
+Tasks are routed to one of ``SOCIAL_NETWORK_SIGNAL_QUEUES`` queues (``social_network.signals.<n>``) by the group, or
+otherwise the user, the signal is about. Consuming each queue with a single worker process (``-c 1``) keeps the
+signals about the same group or user in order.
+
+Tasks are queued once the sending transaction is committed (see ``on_commit``): the worker finds the rows, and tasks
+are queued in commit order. Sending from a transaction needs a database backend with commit hooks
+(django-transaction-hooks on Django 1.6).
+
+``SOCIAL_NETWORK_ASYNC_SIGNALS_EAGER`` (defaults to ``CELERY_ALWAYS_EAGER``) runs the task in process, through the
+same serialization, which keeps tests working without a broker.
+
+Receivers registered with ``local_receiver`` are cheap bookkeeping (counters, cache invalidation) whose effects must
+be visible right away, so they are always called synchronously, before the signal is sent.
+"""
+import zlib
+from collections import defaultdict
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Model, get_model
+import signals
+
+ASYNC_SIGNALS = getattr(settings, 'SOCIAL_NETWORK_ASYNC_SIGNALS', False)
+ASYNC_SIGNALS_EAGER = getattr(settings, 'SOCIAL_NETWORK_ASYNC_SIGNALS_EAGER',
+                              getattr(settings, 'CELERY_ALWAYS_EAGER', False))
+SIGNAL_QUEUES = getattr(settings, 'SOCIAL_NETWORK_SIGNAL_QUEUES', 1)
+
+_local_receivers = defaultdict(list)
+
+
+def local_receiver(signal):
+    """
+    Decorator registering a function to be called synchronously whenever signal is sent through ``send``.
+    """
+    def decorator(func):
+        _local_receivers[signal].append(func)
+        return func
+    return decorator
+
+
+def signal_name(signal):
+    for name, value in vars(signals).items():
+        if value is signal:
+            return name
+    raise ValueError("%r is not a social network signal." % signal)
+
+
+def model_label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.object_name)
+
+
+def serialize(value):
+    if isinstance(value, Model):
+        return {'model': model_label(value.__class__), 'pk': value.pk}
+    if isinstance(value, (list, tuple)):
+        return [serialize(item) for item in value]
+    return value
+
+
+def deserialize(value):
+    """
+    Loads back the model instances serialized by ``serialize``. Raises ObjectDoesNotExist if any of them is missing.
+    """
+    if isinstance(value, dict) and set(value.keys()) == set(['model', 'pk']):
+        model = get_model(*value['model'].split('.'))
+        return model._default_manager.get(pk=value['pk'])
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) and 'model' in item for item in value):
+            model = get_model(*value[0]['model'].split('.'))
+            objects = model._default_manager.in_bulk([item['pk'] for item in value])
+            if len(objects) != len(set(item['pk'] for item in value)):
+                raise model.DoesNotExist("Some of the %s instances do not exist." % value[0]['model'])
+            return [objects[item['pk']] for item in value]
+        return [deserialize(item) for item in value]
+    return value
+
+
+def ordering_key(kwargs):
+    """
+    Signals about a group are ordered per group, every other signal is ordered per user.
+    """
+    group = kwargs.get('group') or getattr(kwargs.get('instance'), 'group', None)
+    if group is not None:
+        return 'group:%s' % group.pk
+    return 'user:%s' % kwargs['user'].pk
+
+
+def on_commit(func, using=None):
+    """
+    Calls func once the current transaction is committed, right away outside of a transaction. Deferring needs a
+    database backend with commit hooks (django-transaction-hooks, built into Django >= 1.9).
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if hasattr(connection, 'on_commit'):
+        connection.on_commit(func)
+    elif not connection.in_atomic_block:
+        func()
+    else:
+        raise ImproperlyConfigured(
+            "Queueing social network tasks from a transaction needs a database backend with commit hooks, "
+            "see django-transaction-hooks."
+        )
+
+
+def run_task(task, args, **options):
+    """
+    Queues a Celery task once the current transaction is committed, so the worker finds the rows it is about and
+    tasks are queued in the order their transactions commit. In eager mode the task runs right away, in process.
+    """
+    if ASYNC_SIGNALS_EAGER:
+        return task.apply(args=args)
+    on_commit(lambda: task.apply_async(args=args, **options))
+
+
+def send(signal, sender, **kwargs):
+    for func in _local_receivers.get(signal, ()):
+        func(sender=sender, signal=signal, **kwargs)
+    if not ASYNC_SIGNALS:
+        return signal.send(sender=sender, **kwargs)
+
+    from tasks import dispatch_signal
+    args = (signal_name(signal), model_label(sender), dict((key, serialize(value)) for key, value in kwargs.items()))
+    queue = 'social_network.signals.%s' % (zlib.crc32(ordering_key(kwargs)) % SIGNAL_QUEUES)
+    run_task(dispatch_signal, args, queue=queue)
+    return []
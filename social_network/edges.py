@@ -0,0 +1,101 @@
+# coding=utf-8
+"""
+Direct, set-based access to the social_graph edge table.
+
+The Graph API answers questions about one node (or one pair of nodes) at a time. The helpers in here
+query the ``social_graph.Edge`` rows directly so that a whole set of nodes can be resolved at once.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from social_graph.models import Edge
+from utils import keyset_page
+
+INTEGER_FIELDS = ('AutoField', 'IntegerField', 'BigIntegerField', 'PositiveIntegerField', 'SmallIntegerField',
+                  'PositiveSmallIntegerField')
+
+
+def node_type(node_or_model):
+    return ContentType.objects.get_for_model(node_or_model)
+
+
+def edges_from(node, etype, site=None):
+    """
+    Returns a queryset of the edges of type(s) ``etype`` going out of ``node``.
+
+    :param node: A model instance.
+    :param etype: An EdgeType instance, or a list of them.
+    :param site: Optionally restrict the edges to a Site.
+
+    """
+    queryset = Edge.objects.filter(fromNode_type=node_type(node), fromNode_pk=str(node.pk))
+    if isinstance(etype, (list, tuple, set)):
+        queryset = queryset.filter(type__in=list(etype))
+    else:
+        queryset = queryset.filter(type=etype)
+    if site is not None:
+        queryset = queryset.filter(site=site)
+    return queryset
+
+
+def edges_from_pks(model, pks, etype, site=None):
+    """
+    Returns a queryset of the edges of type ``etype`` going out of any of the ``model`` instances with the given pks.
+    """
+    queryset = Edge.objects.filter(fromNode_type=node_type(model), fromNode_pk__in=[str(pk) for pk in pks], type=etype)
+    if site is not None:
+        queryset = queryset.filter(site=site)
+    return queryset
+
+
+def edges_to(queryset, nodes):
+    """
+    Restricts an edge queryset to the edges pointing to any of ``nodes`` (all of the same model).
+    """
+    nodes = list(nodes)
+    if not nodes:
+        return queryset.none()
+    return queryset.filter(toNode_type=node_type(nodes[0]), toNode_pk__in=[str(node.pk) for node in nodes])
+
+
+def edges_to_pks(queryset, model, pks):
+    """
+    Restricts an edge queryset to the edges pointing to any of the ``model`` instances with the given pks.
+    """
+    return queryset.filter(toNode_type=node_type(model), toNode_pk__in=[str(pk) for pk in pks])
+
+
+def target_pks(edges, model):
+    """
+    Returns a subquery selecting the pks of the ``model`` instances the edges of an edge queryset point to.
+
+    Node pks are stored as text in the edge table, so for integer pks the subquery casts them back, allowing
+    ``model.objects.filter(pk__in=target_pks(...))`` to be resolved by the database with an index lookup and
+    without sending the ids through Python.
+    """
+    edges = edges.filter(toNode_type=node_type(model))
+    connection = connections[edges.db]
+    qn = connection.ops.quote_name
+    column = '%s.%s' % (qn(Edge._meta.db_table), qn(Edge._meta.get_field('toNode_pk').column))
+    if model._meta.pk.get_internal_type() in INTEGER_FIELDS:
+        column = 'CAST(%s AS %s)' % (column, 'SIGNED' if connection.vendor == 'mysql' else 'INTEGER')
+    return edges.extra(select={'target_pk': column}).values_list('target_pk', flat=True)
+
+
+def edge_page(queryset, cursor=None, limit=20):
+    """
+    Keyset pagination over an edge queryset, newest edges first. See ``social_network.utils.keyset_page``.
+    """
+    return keyset_page(queryset, 'time', cursor, limit)
+
+
+def iter_edges(queryset, batch_size=500):
+    """
+    Iterates over an edge queryset in keyset paginated batches, so memory stays bounded no matter its size.
+    """
+    cursor = None
+    while True:
+        edges, cursor = edge_page(queryset, cursor, batch_size)
+        for edge in edges:
+            yield edge
+        if cursor is None:
+            break
@@ -0,0 +1,142 @@
+# coding=utf-8
+"""
+Resolution of post URLs to embeddable HTML.
+
+A URL is offered to the registered providers in order; the first one returning some HTML wins, otherwise the URL
+is rendered as a link. Results are memoized per URL in a bounded LRU, since the same URLs are rendered over and over
+in the feeds. More providers can be added with ``register_provider``:
+
+    @register_provider
+    def soundcloud(url):
+        if SOUNDCLOUD_REGEX.match(url):
+            return u'<iframe ...></iframe>'
+
+"""
+import re
+import threading
+from collections import OrderedDict
+from urlparse import urlparse
+from django.conf import settings
+from django.utils.html import escape
+
+EMBED_CACHE_SIZE = getattr(settings, 'SOCIAL_NETWORK_EMBED_CACHE_SIZE', 2048)
+FORMAT_LIST = getattr(settings, 'IMAGES_FORMAT_LIST', ['jpeg', 'jpg', 'png', 'gif'])
+VIDEO_FORMAT_LIST = getattr(settings, 'VIDEOS_FORMAT_LIST', ['mp4', 'webm', 'ogv'])
+
+YOUTUBE_URL_REGEX = re.compile(
+    ur'(?:https?:\/\/)?(?:www\.)?youtu\.?be(?:\.com)?\/?.*(?:watch|embed)?(?:.*v=|v\/|\/)([\w\-&=]+)',
+    re.MULTILINE | re.IGNORECASE
+)
+YOUTUBE_ID_REGEX = re.compile(
+    ur'(?:https?:\/\/)?(?:[0-9A-Z-]+\.)?(?:youtube|youtu|youtube-nocookie)\.(?:com|be)\/(?:watch\?v=|watch\?vi=|watch\?.+&v=|watch\?.+&vi=|embed\/|v\/|vi\/|\?v=|\?vi=|.+\?v=|.+\?vi=)?([^&=\n%\?]{11})',
+    re.MULTILINE | re.IGNORECASE
+)
+VIMEO_REGEX = re.compile(
+    ur'(?:https?:\/\/)?(?:www\.|player\.)?vimeo\.com\/(?:video\/|channels\/[\w\-]+\/|groups\/[\w\-]+\/videos\/)?(\d+)',
+    re.IGNORECASE
+)
+
+
+class LRUCache(object):
+    """
+    A thread safe mapping keeping at most size items, evicting the least recently used one.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                return None
+            self.items[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            if len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class EmbedResolver(object):
+
+    def __init__(self, cache_size=EMBED_CACHE_SIZE):
+        self.providers = []
+        self.cache = LRUCache(cache_size)
+
+    def register(self, provider):
+        self.providers.append(provider)
+        self.cache.clear()
+        return provider
+
+    def resolve(self, url):
+        html = self.cache.get(url)
+        if html is None:
+            html = self.render(url)
+            self.cache.set(url, html)
+        return html
+
+    def render(self, url):
+        default = u'<a rel="nofollow" href="{0}" target="_blank">{0}</a>'.format(escape(url))
+        for provider in self.providers:
+            try:
+                html = provider(url)
+            except Exception:
+                # a broken provider doesn't keep the next ones from trying
+                continue
+            if html:
+                return html
+        return default
+
+
+resolver = EmbedResolver()
+register_provider = resolver.register
+
+
+def extension(url):
+    path = urlparse(url).path
+    return path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+
+
+@register_provider
+def youtube(url):
+    if YOUTUBE_URL_REGEX.match(url):
+        youtube_id = YOUTUBE_ID_REGEX.search(url).groups()[0]
+        return u'<iframe width="100%" height="315" src="http://www.youtube.com/embed/{0}"></iframe>'.format(
+            escape(youtube_id)
+        )
+
+
+@register_provider
+def vimeo(url):
+    match = VIMEO_REGEX.match(url)
+    if match:
+        return u'<iframe width="100%" height="315" src="https://player.vimeo.com/video/{0}"></iframe>'.format(
+            match.group(1)
+        )
+
+
+@register_provider
+def direct_video(url):
+    if extension(url) in VIDEO_FORMAT_LIST:
+        return u'<video src="{0}" controls style="width:100%"></video>'.format(escape(url))
+
+
+@register_provider
+def image(url):
+    if extension(url) in FORMAT_LIST:
+        return u'<img src="{0}" class="img-responsive" style="width:100%" alt="{0}"/>'.format(escape(url))
+
+
+def render_url(url):
+    return resolver.resolve(url)
@@ -0,0 +1,67 @@
+# coding=utf-8
+"""
+Coalescing of follow/unfollow toggles.
+
+When ``SOCIAL_NETWORK_FOLLOW_COALESCE_WINDOW`` (seconds) is set, toggles on a (follower, followed) pair are counted in
+the cache, and the first pending one schedules a task applying them at the end of the window. The task claims the
+toggles counted so far (a decr, so toggles landing meanwhile stay pending for the next window) and flips the actual
+relationship if their number is odd. An even number of toggles writes nothing.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+FOLLOW_COALESCE_WINDOW = getattr(settings, 'SOCIAL_NETWORK_FOLLOW_COALESCE_WINDOW', 0)
+
+
+def _count_key(follower_pk, followed_pk, site_id):
+    return 'social_network:follow_toggles:%s:%s:%s' % (site_id, follower_pk, followed_pk)
+
+
+def _schedule(follower_pk, followed_pk, site_id):
+    from dispatch import run_task
+    from tasks import apply_follow_toggles
+    run_task(apply_follow_toggles, (follower_pk, followed_pk, site_id), countdown=FOLLOW_COALESCE_WINDOW)
+
+
+def coalesced_toggle(follower, followed):
+    """
+    Records a toggle, returning the (following, followers count) tuple the pair will have once the pending toggles
+    are applied.
+    """
+    site_id = follower.get_site().pk
+    count_key = _count_key(follower.pk, followed.pk, site_id)
+    # read before the task may run (in eager mode it runs right away)
+    current, followers = followed.followed_by(follower), followed.followers()
+    # outlives the window, in case the task is late
+    cache.add(count_key, 0, FOLLOW_COALESCE_WINDOW * 10)
+    try:
+        count = cache.incr(count_key)
+    except ValueError:
+        # evicted in the meantime, don't lose the toggle
+        return follower.toggle_follow(followed, coalesce=False)
+    if count == 1:
+        _schedule(follower.pk, followed.pk, site_id)
+    following = current != bool(count % 2)
+    return following, followers + int(following) - int(current)
+
+
+def apply_pending_toggles(follower_pk, followed_pk, site_id):
+    """
+    Claims the toggles recorded on the pair and flips the relationship if their number is odd. Toggles recorded
+    while claiming are left pending, and scheduled again.
+    """
+    count_key = _count_key(follower_pk, followed_pk, site_id)
+    count = cache.get(count_key)
+    if not count:
+        return
+    try:
+        remaining = cache.decr(count_key, count)
+    except ValueError:
+        return
+    if remaining:
+        _schedule(follower_pk, followed_pk, site_id)
+    if count % 2:
+        users = get_user_model().objects.in_bulk([follower_pk, followed_pk])
+        if len(users) == 2:
+            users[follower_pk].toggle_follow(users[followed_pk], coalesce=False)
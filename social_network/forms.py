@@ -14,6 +14,7 @@ from models import (
     GroupMembershipRequest, 
     FeedComment,
 )
+from shared_images import store_shared_image
 
 
 class FriendRequestForm(forms.ModelForm):
@@ -181,16 +182,8 @@ class ShareSocialGroupForm(forms.ModelForm):
         groups = self.cleaned_data.get('groups', None)
         content_object = content_object or self.content_object
         if comment and comment != "" and groups and groups and content_object and commit:
-            group_posts = []
-            for group in groups:
-                url = content_object.get_absolute_url() if getattr(content_object, 'get_absolute_url', False) else content_object.get_url()
-                group_post = GroupPost.objects.create(
-                    creator=self.cleaned_data['creator'],
-                    group=SocialGroup.objects.get(pk=group),
-                    comment=comment,
-                    url=url,
-                    image=content_object.get_picture(),
-                )
-                group_posts.append(group_post)
-            return group_posts
+            url = content_object.get_absolute_url() if getattr(content_object, 'get_absolute_url', False) else content_object.get_url()
+            # stored (at most) once, and referenced by every post
+            image = store_shared_image(content_object.get_picture())
+            return GroupPost.objects.share(self.cleaned_data['creator'], groups, comment, url, image)
         return None
\ No newline at end of file
@@ -0,0 +1,32 @@
+# coding=utf-8
+"""
+Versions of the cached post fragments.
+
+The shared part of a rendered feed post is cached under (feed item id, content version, language). The version is
+kept per post and replaced whenever the post is edited or erased (see ``post_save_group_post`` and
+``social_network_group_post_deleted``), so stale fragments are never read again and simply expire.
+"""
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+
+POST_FRAGMENT_TIMEOUT = getattr(settings, 'SOCIAL_NETWORK_POST_FRAGMENT_TIMEOUT', 60 * 60 * 24)
+
+
+def _version_key(post_pk):
+    return 'social_network:post_version:%s' % post_pk
+
+
+def post_version(post_pk):
+    if post_pk is None:
+        return '0'
+    key = _version_key(post_pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_post_version(post_pk):
+    cache.set(_version_key(post_pk), uuid.uuid4().hex, None)
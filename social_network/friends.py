@@ -0,0 +1,129 @@
+# coding=utf-8
+"""
+Mutual friends and "people you may know" suggestions.
+
+Friend lists are handled as sorted ``array('l')`` of user pks: compact, cheap to cache and intersected with a
+linear merge (or binary searches when one side is much smaller than the other).
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import Count
+from edges import edges_from, edges_from_pks
+from utils import friendship_edge
+
+# friends of the user whose friend lists are read to compute suggestions (the most recent friendships)
+SUGGESTIONS_MAX_FRIENDS = getattr(settings, 'SOCIAL_NETWORK_SUGGESTIONS_MAX_FRIENDS', 200)
+# friendship rows read in total to compute suggestions
+SUGGESTIONS_MAX_EDGES = getattr(settings, 'SOCIAL_NETWORK_SUGGESTIONS_MAX_EDGES', 20000)
+# friendship rows taken into account per friend, so a single hub doesn't use up the whole budget
+SUGGESTIONS_MAX_PER_FRIEND = getattr(settings, 'SOCIAL_NETWORK_SUGGESTIONS_MAX_PER_FRIEND', 500)
+# candidates ranked per suggestion asked for, the extra ones stand in for friends left out of the friends read
+SUGGESTIONS_OVERFETCH = getattr(settings, 'SOCIAL_NETWORK_SUGGESTIONS_OVERFETCH', 3)
+
+
+def sorted_ids(values):
+    return array('l', sorted(set(int(value) for value in values)))
+
+
+def intersect(ids1, ids2):
+    """
+    Returns the sorted array of the ids present in both sorted arrays.
+    """
+    if len(ids1) > len(ids2):
+        ids1, ids2 = ids2, ids1
+    result = array('l')
+    if not ids1:
+        return result
+    if len(ids1) * 8 < len(ids2):
+        # much smaller: binary search each of its ids in the larger one
+        low = 0
+        for value in ids1:
+            low = bisect_left(ids2, value, low)
+            if low == len(ids2):
+                break
+            if ids2[low] == value:
+                result.append(value)
+        return result
+    i = j = 0
+    while i < len(ids1) and j < len(ids2):
+        if ids1[i] < ids2[j]:
+            i += 1
+        elif ids1[i] > ids2[j]:
+            j += 1
+        else:
+            result.append(ids1[i])
+            i += 1
+            j += 1
+    return result
+
+
+def rank_second_degree(friend_ids, adjacency, exclude, limit):
+    """
+    Ranks the friends of friends by number of mutual friends.
+
+    :param friend_ids: The ids of the user's friends.
+    :param adjacency: A dict mapping (some of) those friend ids to the ids of their own friends.
+    :param exclude: Container of ids which must not be suggested (the user and their friends).
+    :param limit: The maximum number of suggestions.
+    :return: A list of (id, mutual friends count) tuples, best suggestions first.
+
+    """
+    counts = defaultdict(int)
+    for friend_id in friend_ids:
+        for candidate in adjacency.get(friend_id, ()):
+            counts[candidate] += 1
+    return heapq.nlargest(
+        limit,
+        ((candidate, count) for candidate, count in counts.iteritems() if candidate not in exclude),
+        key=lambda item: (item[1], -item[0])
+    )
+
+
+def friend_ids(user, site=None):
+    """
+    Returns the sorted array of the pks of the user's friends, in a single query.
+    """
+    edges = edges_from(user, friendship_edge(), site or user.get_site())
+    return sorted_ids(edges.values_list('toNode_pk', flat=True))
+
+
+def friend_adjacency(user, site=None, max_friends=SUGGESTIONS_MAX_FRIENDS, max_edges=SUGGESTIONS_MAX_EDGES,
+                     max_per_friend=SUGGESTIONS_MAX_PER_FRIEND):
+    """
+    Returns the sorted array of the ids of the user's max_friends most recent friends, along with a dict mapping
+    them to (up to max_per_friend of) their own most recent friend ids. Reads at most max_edges friendship rows.
+
+    The friends with at most max_per_friend friendships are read in one query, the ones with more (hubs) one query
+    each, with a limit, so a hub can't use up the budget of the others.
+    """
+    site = site or user.get_site()
+    friendship = friendship_edge()
+    recent = [int(pk) for pk in edges_from(user, friendship, site).order_by('-time').values_list(
+        'toNode_pk', flat=True
+    )[:max_friends]]
+    edges = edges_from_pks(user.__class__, recent, friendship, site).order_by()
+    counts = dict((int(pk), count) for pk, count in edges.values_list('fromNode_pk').annotate(count=Count('pk')))
+    # the budget goes to the most recent friendships first
+    small, hubs = [], []
+    budget = max_edges
+    for friend_id in recent:
+        count = min(counts.get(friend_id, 0), max_per_friend)
+        if not count:
+            continue
+        if count > budget:
+            break
+        budget -= count
+        (hubs if counts[friend_id] > max_per_friend else small).append(friend_id)
+    adjacency = defaultdict(list)
+    if small:
+        for from_pk, to_pk in edges_from_pks(user.__class__, small, friendship, site).values_list(
+            'fromNode_pk', 'toNode_pk'
+        ):
+            adjacency[int(from_pk)].append(int(to_pk))
+    for friend_id in hubs:
+        edges = edges_from_pks(user.__class__, [friend_id], friendship, site).order_by('-time')
+        adjacency[friend_id] = [int(pk) for pk in edges.values_list('toNode_pk', flat=True)[:max_per_friend]]
+    return sorted_ids(recent), adjacency
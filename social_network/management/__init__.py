@@ -2,6 +2,7 @@
 from django.db.models.signals import post_syncdb
 from django.conf import settings
 from .. import models as social_app
+from ..utils import edge_types, event_types
 
 AUTOCONFIGURE_NOTIFICATIONS = getattr(settings, 'SOCIAL_NETWORK_AUTOCONFIGURE_NOTIFICATIONS', True)
 POST_ACTION_READ_AS = getattr(settings, 'SOCIAL_NETWORK_POST_ACTION_READ_AS', 'Post')
@@ -35,6 +36,8 @@ def create_edge_types(**kwargs):
     })
     EdgeTypeAssociation.objects.get_or_create(direct=member_of, inverse=integrated_by)
 
+    edge_types.invalidate()
+
 post_syncdb.connect(create_edge_types, sender=social_app)
 
 
@@ -86,5 +89,7 @@ def configure_notifications(**kwargs):
         }
     )
 
+    event_types.invalidate()
+
 if AUTOCONFIGURE_NOTIFICATIONS:
     post_syncdb.connect(configure_notifications, sender=social_app)
\ No newline at end of file
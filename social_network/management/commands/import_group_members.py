@@ -0,0 +1,62 @@
+# coding=utf-8
+import csv
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    args = '<group_slug> <csv_file>'
+    help = "Adds the users listed in the first column of a CSV file as members of a social group."
+    option_list = BaseCommand.option_list + (
+        make_option('--field', dest='field', default='username',
+                    help="User field the CSV values refer to: username (default), email or pk."),
+        make_option('--acceptor', dest='acceptor', default=None,
+                    help="Username of the group administrator accepting the members (required for closed groups)."),
+        make_option('--batch-size', dest='batch_size', type='int', default=500,
+                    help="Number of members written per transaction."),
+    )
+
+    def handle(self, *args, **options):
+        from ...models import User, SocialGroup
+        from ...utils import chunks
+        if len(args) != 2:
+            raise CommandError("Usage: import_group_members %s" % self.args)
+        slug, path = args
+        field = options['field']
+        if field not in ('username', 'email', 'pk'):
+            raise CommandError("--field must be one of username, email or pk.")
+        batch_size = options['batch_size']
+
+        try:
+            group = SocialGroup.on_site.get(slug=slug)
+        except SocialGroup.DoesNotExist:
+            raise CommandError("Social group '%s' does not exist." % slug)
+        acceptor = None
+        if options['acceptor']:
+            try:
+                acceptor = User.objects.get(username=options['acceptor'])
+            except User.DoesNotExist:
+                raise CommandError("User '%s' does not exist." % options['acceptor'])
+
+        def read_values(csv_file):
+            # the csv module reads bytes, values are compared to the (unicode) user fields
+            for row in csv.reader(csv_file):
+                if row and row[0].strip():
+                    yield row[0].strip().decode('utf-8')
+
+        def resolve_users(values):
+            for batch in chunks(values, batch_size):
+                users = User.objects.filter(**{'%s__in' % field: batch})
+                found = set()
+                for user in users:
+                    found.add(unicode(getattr(user, field)))
+                    yield user
+                for value in batch:
+                    if value not in found:
+                        self.stderr.write("No user with %s '%s', skipped." % (field, value))
+
+        with open(path, 'rb') as csv_file:
+            added = group.add_members(resolve_users(read_values(csv_file)), acceptor, batch_size)
+        if added is False:
+            raise CommandError("'%s' is a closed group, an --acceptor administrating it is required." % slug)
+        self.stdout.write("%s members added to %s." % (added, group))
@@ -0,0 +1,54 @@
+# coding=utf-8
+from optparse import make_option
+from django.contrib.sites.models import Site
+from django.core.management.base import NoArgsCommand
+
+
+class Command(NoArgsCommand):
+    help = "Recomputes the followers, following, friends and group membership counters from the graph, " \
+           "reporting the ones that had drifted."
+    option_list = NoArgsCommand.option_list + (
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+                    help="Only report drifted counters, don't fix them."),
+    )
+
+    def handle_noargs(self, **options):
+        from social_graph.api import Graph
+        from ...counters import FOLLOWERS, FOLLOWING, FRIENDS, MEMBERS, SOCIAL_GROUPS, peek_counter, set_counter
+        from ...models import User, SocialGroup
+        from ...utils import followed_by_edge, follower_of_edge, friendship_edge, member_of_edge, integrated_by_edge
+        graph = Graph()
+        dry_run = options['dry_run']
+        checked = drifted = 0
+
+        def check(obj, name, site, count):
+            cached = peek_counter(obj, name, site.pk)
+            if cached is not None and cached != count:
+                self.stdout.write("%s %s: %s counted %s, cached %s" % (obj, obj.pk, name, count, cached))
+                result = 1
+            else:
+                result = 0
+            if not dry_run:
+                set_counter(obj, name, site.pk, count)
+            return result
+
+        site = Site.objects.get_current()
+        user_counters = (
+            (FOLLOWERS, followed_by_edge()),
+            (FOLLOWING, follower_of_edge()),
+            (FRIENDS, friendship_edge()),
+            (SOCIAL_GROUPS, member_of_edge()),
+        )
+        for user in User.objects.iterator():
+            for name, etype in user_counters:
+                drifted += check(user, name, site, graph.edge_count(user, etype, site))
+                checked += 1
+
+        integrated_by = integrated_by_edge()
+        for group in SocialGroup.objects.select_related('site').iterator():
+            drifted += check(group, MEMBERS, group.site, graph.edge_count(group, integrated_by, group.site))
+            checked += 1
+
+        self.stdout.write("%s counters checked, %s drifted%s." % (
+            checked, drifted, "" if dry_run else " and fixed"
+        ))
@@ -0,0 +1,87 @@
+# coding=utf-8
+"""
+Cached membership and administrator sets.
+
+The pks of the groups a user is a member of are loaded with a single query and cached under a versioned key.
+Changing a user's memberships bumps the version (see the receivers in ``social_network.models``), so stale sets
+are never read and simply expire.
+
+The pks of the administrators of a group are cached too, and dropped whenever SocialGroup.administrators changes.
+"""
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from edges import edges_from
+from utils import member_of_edge
+
+MEMBERSHIP_CACHE_TIMEOUT = getattr(settings, 'SOCIAL_NETWORK_MEMBERSHIP_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _version_key(user_pk):
+    return 'social_network:memberships:version:%s' % user_pk
+
+
+def membership_version(user_pk):
+    key = _version_key(user_pk)
+    version = cache.get(key)
+    if version is None:
+        # a fresh random version, so sets cached under a previous (evicted) version can't be read again
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_memberships(user):
+    cache.set(_version_key(user.pk), uuid.uuid4().hex, None)
+    try:
+        del user._social_group_ids
+    except AttributeError:
+        pass
+
+
+def social_group_ids(user):
+    """
+    Returns a frozenset with the pks of the groups the user is a member of. It is loaded at most once per version
+    and then memoized on the user instance, so further checks on the same instance don't leave the process.
+    """
+    ids = getattr(user, '_social_group_ids', None)
+    if ids is not None:
+        return ids
+    key = 'social_network:memberships:%s:%s' % (user.pk, membership_version(user.pk))
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(int(pk) for pk in edges_from(user, member_of_edge()).values_list('toNode_pk', flat=True))
+        cache.set(key, ids, MEMBERSHIP_CACHE_TIMEOUT)
+    user._social_group_ids = ids
+    return ids
+
+
+def _administrators_key(group_pk):
+    return 'social_network:administrators:%s' % group_pk
+
+
+def invalidate_administrators(group):
+    cache.delete(_administrators_key(group.pk))
+    try:
+        del group._administrator_ids
+    except AttributeError:
+        pass
+
+
+def administrator_ids(group):
+    """
+    Returns a frozenset with the pks of the administrators of the group (not including its creator), loaded with a
+    single query on the m2m table and then cached.
+    """
+    ids = getattr(group, '_administrator_ids', None)
+    if ids is not None:
+        return ids
+    key = _administrators_key(group.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(group.administrators.through.objects.filter(socialgroup=group.pk).values_list(
+            'user_id', flat=True
+        ))
+        cache.set(key, ids, MEMBERSHIP_CACHE_TIMEOUT)
+    group._administrator_ids = ids
+    return ids
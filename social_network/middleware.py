@@ -1 +1,70 @@
-# coding=utf-8'
+# coding=utf-8
+import logging
+import threading
+from django.conf import settings
+from django.contrib.sites.models import Site
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+class IdentityMap(object):
+    """
+    Memoizes object lookups (users by username, groups by slug, the current site...) for the span of a request,
+    counting how many of them were served from memory.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        try:
+            value = self.objects[key]
+        except KeyError:
+            self.misses += 1
+            value = self.objects[key] = load()
+        else:
+            self.hits += 1
+        return value
+
+
+def current_identity_map():
+    return getattr(_state, 'identity_map', None)
+
+
+def resolve(key, load):
+    """
+    Returns the object memoized under key for the current request, calling load to get it the first time.
+    Outside of a request handled by IdentityMapMiddleware, load is always called.
+    """
+    identity_map = current_identity_map()
+    if identity_map is None:
+        return load()
+    return identity_map.get(key, load)
+
+
+def current_site():
+    return resolve(('site', settings.SITE_ID), Site.objects.get_current)
+
+
+class IdentityMapMiddleware(object):
+    """
+    Attaches a request scoped IdentityMap to the request (as ``request.social_identity_map``) and makes it available
+    to the template tags and models of this app. Hits and misses are logged at debug level, and sent in the
+    X-Social-Identity-Map response header when DEBUG is on.
+    """
+
+    def process_request(self, request):
+        request.social_identity_map = _state.identity_map = IdentityMap()
+
+    def process_response(self, request, response):
+        identity_map = current_identity_map()
+        _state.identity_map = None
+        if identity_map is not None:
+            logger.debug("Identity map for %s: %s hits, %s misses", request.path, identity_map.hits, identity_map.misses)
+            if settings.DEBUG:
+                response['X-Social-Identity-Map'] = 'hits=%s; misses=%s' % (identity_map.hits, identity_map.misses)
+        return response
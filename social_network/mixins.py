@@ -1,5 +1,6 @@
 # coding=utf-8
 from content_interactions.mixins import ContentInteractionMixin
+from derivatives import derivative_url
 
 
 class ShareToSocialGroupTargetMixin(ContentInteractionMixin):
@@ -10,4 +11,26 @@ class ShareToSocialGroupTargetMixin(ContentInteractionMixin):
 
     def get_url(self):
         url = getattr(self, 'url', "")
-        return url() if callable(url) else url
\ No newline at end of file
+        return url() if callable(url) else url
+
+
+class ImageDerivativesMixin(object):
+    """
+    Urls of the resized variants of the image field, see social_network.derivatives.
+    """
+
+    @property
+    def image_thumb_url(self):
+        return derivative_url(self.image, 'thumb')
+
+    @property
+    def image_thumb_webp_url(self):
+        return derivative_url(self.image, 'thumb_webp')
+
+    @property
+    def image_medium_url(self):
+        return derivative_url(self.image, 'medium')
+
+    @property
+    def image_medium_webp_url(self):
+        return derivative_url(self.image, 'medium_webp')
@@ -1,13 +1,21 @@
 # coding: utf-8
+import datetime
+import heapq
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.managers import CurrentSiteManager
 from django.contrib.sites.models import Site
-from django.db import models
+from django.db import IntegrityError, models
+from django.db.models import Max, Q
+from django.db.models.query import prefetch_related_objects
+from django.db.transaction import atomic
 from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.encoding import force_text
 from django.utils.text import slugify
 from django.utils.translation import ugettext_lazy as _
 from social_graph import Graph
-from notifications.models import Event, NotificationTemplateConfig
+from notifications.models import Event, EventAttendantsConfig, NotificationTemplateConfig
 from content_interactions.mixins import (
     LikableMixin,
     DenounceTargetMixin,
@@ -15,7 +23,14 @@ from content_interactions.mixins import (
     ShareToSocialNetworkTargetMixin
 )
 from content_interactions_stats.mixins import StatsMixin
-from mixins import ShareToSocialGroupTargetMixin
+from derivatives import ensure_derivatives
+from dispatch import local_receiver, run_task, send
+from follows import FOLLOW_COALESCE_WINDOW, coalesced_toggle
+from fragments import bump_post_version
+from middleware import current_site
+from memberships import administrator_ids, invalidate_administrators, invalidate_memberships, social_group_ids
+from mixins import ImageDerivativesMixin, ShareToSocialGroupTargetMixin
+from shared_images import release_shared_image
 from signals import (
     follower_relationship_created,
     follower_relationship_destroyed,
@@ -24,36 +39,50 @@ from signals import (
     social_group_created,
     social_group_membership_request_created,
     social_group_member_added,
+    social_group_members_added,
     social_group_post_created,
     social_group_post_deleted,
     profile_comment_created,
 )
+from counters import (
+    FOLLOWERS,
+    FOLLOWING,
+    FRIENDS,
+    MEMBERS,
+    SOCIAL_GROUPS,
+    get_counter,
+    reset_counter,
+    update_counter
+)
+from friends import SUGGESTIONS_OVERFETCH, friend_adjacency, friend_ids, intersect, rank_second_degree
+from edges import edges_from, edges_from_pks, edges_to, edges_to_pks, edge_page, target_pks
 from utils import (
     followed_by_edge,
     follower_of_edge,
     friendship_edge,
     integrated_by_edge,
     member_of_edge,
+    chunks,
+    keyset_page,
     generate_sha1,
-    group_post_event_type
+    group_post_event_type,
+    unique_slug
 )
 
 graph = Graph()
 
+SLUG_ATTEMPTS = 5
+
 
 class SocialNetworkUserManager(object):
 
     def followed_by_users(self, user):
-        follower_of = follower_of_edge()
-        count = graph.edge_count(user, follower_of)
-        ids = [node.pk for node, attributes, time in graph.edge_range(user, follower_of, 0, count)]
-        return self.get_queryset().filter(pk__in=ids)
+        edges = edges_from(user, follower_of_edge(), user.get_site())
+        return self.get_queryset().filter(pk__in=target_pks(edges, self.model))
 
     def members_of(self, group):
-        integrated_by = integrated_by_edge()
-        count = graph.edge_count(group, integrated_by)
-        ids = [node.pk for node, attributes, time in graph.edge_range(group, integrated_by, 0, count)]
-        return self.get_queryset().filter(pk__in=ids)
+        edges = edges_from(group, integrated_by_edge(), group.site_id)
+        return self.get_queryset().filter(pk__in=target_pks(edges, self.model))
 
 
 class SocialNetworkUserMixin(models.Model):
@@ -67,17 +96,21 @@ class SocialNetworkUserMixin(models.Model):
         return 'user:request_friendship', [self.username]
 
     def get_site(self):
-        return Site.objects.get_current()
+        return current_site()
+
+    def _counter(self, name, etype):
+        site = self.get_site()
+        return get_counter(self, name, site.pk, lambda: graph.edge_count(self, etype(), site))
 
     def followers(self):
-        return graph.edge_count(self, followed_by_edge(), self.get_site())
+        return self._counter(FOLLOWERS, followed_by_edge)
 
     def follower_list(self):
         count = self.followers()
         return [node for node, attributes, time in graph.edge_range(self, followed_by_edge(), 0, count, self.get_site())]
 
     def following(self):
-        return graph.edge_count(self, follower_of_edge(), self.get_site())
+        return self._counter(FOLLOWING, follower_of_edge)
 
     def following_list(self):
         count = self.following()
@@ -87,34 +120,87 @@ class SocialNetworkUserMixin(models.Model):
         return graph.edge_get(self, followed_by_edge(), user, self.get_site()) is not None
 
     def follow(self, user):
+        if user.followed_by(self):
+            # already following, nothing to count nor announce
+            return True
         _edge = graph.edge(self, user, follower_of_edge(), self.get_site(), {})
         if _edge:
-            follower_relationship_created.send(sender=self.__class__, followed=user, user=self)
+            send(follower_relationship_created, sender=self.__class__, followed=user, user=self)
         return _edge
 
     def stop_following(self, user):
         _deleted = graph.no_edge(self, user, follower_of_edge(), self.get_site())
         if _deleted:
-            follower_relationship_destroyed.send(sender=self.__class__, followed=user, user=self)
+            send(follower_relationship_destroyed, sender=self.__class__, followed=user, user=self)
         return _deleted
 
+    def toggle_follow(self, user, coalesce=True):
+        """
+        Follows user, or stops following them if already doing so, with a single write. Returns a (following,
+        followers count) tuple, the count read from the counter store. Rapid toggles on the same pair are coalesced
+        when SOCIAL_NETWORK_FOLLOW_COALESCE_WINDOW is set, see ``social_network.follows``.
+        """
+        if coalesce and FOLLOW_COALESCE_WINDOW:
+            return coalesced_toggle(self, user)
+        site = self.get_site()
+        follower_of = follower_of_edge()
+        with atomic():
+            following = not graph.no_edge(self, user, follower_of, site)
+            if following and not graph.edge(self, user, follower_of, site, {}):
+                raise Exception("A problem has occurred while trying to create a follower edge.")
+        send(
+            follower_relationship_created if following else follower_relationship_destroyed,
+            sender=self.__class__,
+            followed=user,
+            user=self
+        )
+        return following, user.followers()
+
     def friend_of(self, user):
         return graph.edge_get(self, friendship_edge(), user, self.get_site()) is not None
 
     def friends(self):
-        return graph.edge_count(self, friendship_edge(), self.get_site())
+        return self._counter(FRIENDS, friendship_edge)
 
     def friend_list(self):
         return [node for node, attributes, time in graph.edge_range(self, friendship_edge(), self.get_site())]
 
+    def mutual_friend_ids(self, user):
+        return intersect(friend_ids(self), friend_ids(user, self.get_site()))
+
+    def mutual_friends(self, user):
+        return User.objects.filter(pk__in=list(self.mutual_friend_ids(user)))
+
+    def mutual_friend_count(self, user):
+        return len(self.mutual_friend_ids(user))
+
+    def friend_suggestions(self, limit=10, **caps):
+        """
+        Returns up to limit (user, mutual friends count) tuples with the friends of friends of this user, the ones
+        with more mutual friends first. See ``social_network.friends.friend_adjacency`` for the accepted caps.
+        """
+        site = self.get_site()
+        ids, adjacency = friend_adjacency(self, site, **caps)
+        exclude = set(ids)
+        exclude.add(self.pk)
+        # only the most recent friends were read: older ones may be ranked, over-fetch and leave them out in the
+        # query loading the users
+        ranking = rank_second_degree(ids, adjacency, exclude, limit * SUGGESTIONS_OVERFETCH)
+        users = User.objects.exclude(pk__in=target_pks(edges_from(self, friendship_edge(), site), User)).in_bulk(
+            [pk for pk, count in ranking]
+        )
+        return [(users[pk], count) for pk, count in ranking if pk in users][:limit]
+
     def make_friend_of(self, user):
+        if self.friend_of(user):
+            return True
         _edge = graph.edge(self, user, friendship_edge(), self.get_site(), {})
         if _edge:
-            friendship_created.send(sender=self.__class__, friend=user, user=self)
+            send(friendship_created, sender=self.__class__, friend=user, user=self)
         return _edge
 
     def social_groups(self):
-        return graph.edge_count(self, member_of_edge(), self.get_site())
+        return self._counter(SOCIAL_GROUPS, member_of_edge)
 
     def social_group_list(self):
         count = self.social_groups()
@@ -126,10 +212,10 @@ class SocialNetworkUserMixin(models.Model):
                 if attributes['role'] == role]
 
     def is_member_of(self, group):
-        return graph.edge_get(group, integrated_by_edge(), self, group.site) is not None
+        return group.pk in social_group_ids(self)
 
     def is_admin_of(self, group):
-        return self in group.administrators.all()
+        return self.pk in administrator_ids(group)
 
     def is_creator_of(self, group):
         return self == group.creator
@@ -137,6 +223,13 @@ class SocialNetworkUserMixin(models.Model):
     def join(self, group):
         return group.add_member(self)
 
+    def group_feed(self, cursor=None, limit=20):
+        """
+        Returns a page of the feed items of every group the user is a member of, newest first, along with the
+        cursor of the next page (None if this is the last one).
+        """
+        return GroupFeedItem.on_site.for_display().merged_page(list(social_group_ids(self)), cursor, limit)
+
 
 from django.contrib.auth.models import User, UserManager
 # modify user class
@@ -196,10 +289,7 @@ def post_save_friend_request(sender, instance, created, **kwargs):
 class SocialGroupManagerMixin(object):
 
     def integrated_by(self, user):
-        member_of = member_of_edge()
-        count = graph.edge_count(user, member_of)
-        ids = [node.pk for node, attributes, time in graph.edge_range(user, member_of, 0, count)]
-        return self.get_queryset().filter(pk__in=ids)
+        return self.get_queryset().filter(pk__in=target_pks(edges_from(user, member_of_edge()), self.model))
 
 
 class SocialGroupManager(SocialGroupManagerMixin, models.Manager):
@@ -211,7 +301,7 @@ class SocialGroupCurrentSiteManager(SocialGroupManagerMixin, CurrentSiteManager)
 
 
 class SocialGroup(models.Model, LikableMixin, DenounceTargetMixin, ShareToSocialNetworkTargetMixin,
-                  ShareToSocialGroupTargetMixin):
+                  ShareToSocialGroupTargetMixin, ImageDerivativesMixin):
     creator = models.ForeignKey(User, related_name='created_groups', verbose_name=_(u'creator'))
     name = models.CharField(_(u'name'), max_length=255)
     slug = models.SlugField(_(u'slug'), max_length=255)
@@ -243,7 +333,27 @@ class SocialGroup(models.Model, LikableMixin, DenounceTargetMixin, ShareToSocial
     def __init__(self, *args, **kwargs):
         super(SocialGroup, self).__init__(*args, **kwargs)
         if not self.pk and not self.site_id:
-            self.site_id = Site.objects.get_current().pk
+            self.site_id = current_site().pk
+
+    def save(self, *args, **kwargs):
+        """
+        Fills the slug of new groups from their name. Slugs already taken are read with a single prefix query; if
+        a concurrent insert takes the chosen one first, the unique constraint fails and the next one is tried.
+        """
+        if self.pk or self.slug:
+            return super(SocialGroup, self).save(*args, **kwargs)
+        max_length = self._meta.get_field('slug').max_length
+        base = slugify(self.name)[:max_length]
+        for attempt in range(SLUG_ATTEMPTS):
+            taken = SocialGroup.objects.filter(site=self.site_id, slug__startswith=base).values_list('slug', flat=True)
+            self.slug = unique_slug(base, taken, max_length)
+            try:
+                with atomic():
+                    return super(SocialGroup, self).save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == SLUG_ATTEMPTS - 1:
+                    self.slug = ''
+                    raise
 
     @models.permalink
     def get_absolute_url(self):
@@ -320,31 +430,51 @@ class SocialGroup(models.Model, LikableMixin, DenounceTargetMixin, ShareToSocial
 
     @property
     def members(self):
-        return graph.edge_count(self, integrated_by_edge())
+        return get_counter(self, MEMBERS, self.site_id, lambda: graph.edge_count(self, integrated_by_edge()))
+
+    def iter_members(self, batch_size=500):
+        """
+        Yields (member, role) tuples for every member of the group, newest members first, reading the membership
+        edges in keyset paginated batches.
+        """
+        cursor = None
+        while True:
+            members, cursor = self.member_page(cursor, batch_size)
+            for member in members:
+                yield member
+            if cursor is None:
+                break
+
+    def member_page(self, cursor=None, limit=20):
+        """
+        Returns a page of (member, role) tuples, newest members first, along with the cursor of the next page
+        (None if this is the last one). Each page costs the same no matter the size of the group.
+        """
+        edges, next_cursor = edge_page(
+            edges_from(self, integrated_by_edge(), self.site_id).only('toNode_pk', 'attributes', 'time'),
+            cursor, limit
+        )
+        users = User.objects.in_bulk([int(edge.toNode_pk) for edge in edges])
+        members = [(users[int(edge.toNode_pk)], edge.attributes.get('role', 'member'))
+                   for edge in edges if int(edge.toNode_pk) in users]
+        return members, next_cursor
 
     @property
     def member_list(self):
-        edge = integrated_by_edge()
-        count = graph.edge_count(self, edge)
-        return [user for user, attributes, time in graph.edge_range(self, edge, 0, count)]
+        return [user for user, role in self.iter_members()]
 
     def specific_role_member_list(self, role):
-        edge = integrated_by_edge()
-        count = graph.edge_count(self, edge)
-        return [user for user, attributes, time in graph.edge_range(self, edge, 0, count) if attributes['role'] == role]
+        return [user for user, user_role in self.iter_members() if user_role == role]
 
     @property
     def member_role_list(self):
-        edge = integrated_by_edge()
-        count = graph.edge_count(self, edge)
-        return dict([(user.pk, attributes.get('role', 'member'))
-                     for user, attributes, time in graph.edge_range(self, edge, 0, count)])
+        return dict([(user.pk, role) for user, role in self.iter_members()])
 
     def has_admin(self, user):
-        return user == self.creator or user in self.administrators.all()
+        return user.pk is not None and (user.pk == self.creator_id or user.pk in administrator_ids(self))
 
     def has_member(self, user):
-        return graph.edge_get(user, member_of_edge(), self) is not None
+        return bool(user.pk) and self.pk in social_group_ids(user)
 
     def relationship_with(self, user):
         edge = graph.edge_get(user, member_of_edge(), self)
@@ -355,9 +485,13 @@ class SocialGroup(models.Model, LikableMixin, DenounceTargetMixin, ShareToSocial
             acceptor = member
         if self.closed and not self.has_admin(acceptor):
             return False
+        if graph.edge_get(member, member_of_edge(), self, self.site) is not None:
+            # already a member (keeping their role)
+            return True
         _edge = graph.edge(member, self, member_of_edge(), self.site, {'role': 'member'})
         if _edge:
-            social_group_member_added.send(
+            send(
+                social_group_member_added,
                 sender=SocialGroup,
                 group=self,
                 member=member,
@@ -367,63 +501,121 @@ class SocialGroup(models.Model, LikableMixin, DenounceTargetMixin, ShareToSocial
         else:
             raise Exception("A problem has occurred while trying to create a membership edge.")
 
-    def __unicode__(self):
-        return u"%s" % self.name
+    def add_members(self, members, acceptor=None, batch_size=500):
+        """
+        Adds many members at once. Meant for imports: members may be any iterable (it is consumed lazily), users
+        who are already members are skipped, each batch is written in a single transaction and announced with a
+        single social_group_members_added signal (social_group_member_added isn't sent).
 
+        Returns the number of members added, or False if acceptor isn't allowed to add members to the group.
+        """
+        if self.closed and (acceptor is None or not self.has_admin(acceptor)):
+            return False
+        member_of = member_of_edge()
+        added = 0
+        for batch in chunks(members, batch_size):
+            batch = dict((member.pk, member) for member in batch).values()
+            existing = set(edges_to(edges_from(self, integrated_by_edge(), self.site_id), batch).values_list(
+                'toNode_pk', flat=True
+            ))
+            new_members = [member for member in batch if str(member.pk) not in existing]
+            if not new_members:
+                continue
+            with atomic():
+                for member in new_members:
+                    if not graph.edge(member, self, member_of, self.site, {'role': 'member'}):
+                        raise Exception("A problem has occurred while trying to create a membership edge.")
+            send(
+                social_group_members_added,
+                sender=SocialGroup,
+                group=self,
+                members=new_members,
+                user=acceptor
+            )
+            added += len(new_members)
+        return added
 
-@receiver(models.signals.pre_save, sender=SocialGroup, dispatch_uid='fill_social_group_slug')
-def fill_social_group_slug(sender, instance, **kwargs):
-    if not instance.pk and not instance.slug:
-        instance.slug = slugify(instance.name)
-        good_slug = False
-        counter = 1
-        while not good_slug:
-            if instance.__class__.objects.filter(slug=instance.slug, site=instance.site).exists():
-                instance.slug = instance.slug[:-1] + '%s' % counter
-                counter += 1
-            else:
-                good_slug = True
+    def __unicode__(self):
+        return u"%s" % self.name
 
 
 @receiver(models.signals.post_save, sender=SocialGroup, dispatch_uid='post_save_social_group')
 def post_save_social_group(sender, instance, created, **kwargs):
+    ensure_derivatives(instance.image)
     if created:
         # add creator to members
         graph.edge(instance.creator, instance, member_of_edge(), instance.site, {'role': 'creator'})
+        update_counter(instance.creator, SOCIAL_GROUPS, instance.site_id, 1)
+        invalidate_memberships(instance.creator)
         social_group_created.send(sender=SocialGroup, instance=instance, user=instance.creator)
 
 
+def membership_changed(user, group):
+    reset_counter(group, MEMBERS, group.site_id)
+    reset_counter(user, SOCIAL_GROUPS, group.site_id)
+    invalidate_memberships(user)
+    invalidate_administrators(group)
+
+
+def sync_admin_edges(group_pks, user_pks):
+    """
+    Makes the admin role membership edges between the given groups and users match SocialGroup.administrators:
+    administrators get an admin edge, users with an admin edge who aren't administrators anymore lose their
+    membership. The current edges are read with one query and only the pairs whose state changes are written, all
+    of them in a single transaction. The group creators keep their own role.
+    """
+    group_pks, user_pks = list(group_pks), list(user_pks)
+    if not group_pks or not user_pks:
+        return
+    desired = set(SocialGroup.administrators.through.objects.filter(
+        socialgroup__in=group_pks, user__in=user_pks
+    ).values_list('socialgroup_id', 'user_id'))
+    member_of = member_of_edge()
+    edges = edges_to_pks(edges_from_pks(User, user_pks, member_of), SocialGroup, group_pks)
+    current = set((int(edge.toNode_pk), int(edge.fromNode_pk))
+                  for edge in edges.only('fromNode_pk', 'toNode_pk', 'attributes')
+                  if edge.attributes.get('role') == 'admin')
+
+    groups = SocialGroup.objects.select_related('site').in_bulk(group_pks)
+    for group in groups.values():
+        invalidate_administrators(group)
+    added = [(group_pk, user_pk) for group_pk, user_pk in desired - current
+             if group_pk in groups and groups[group_pk].creator_id != user_pk]
+    removed = list(current - desired)
+    if not added and not removed:
+        return
+    users = User.objects.in_bulk(set(user_pk for group_pk, user_pk in added + removed))
+    with atomic():
+        for group_pk, user_pk in added:
+            graph.edge(users[user_pk], groups[group_pk], member_of, groups[group_pk].site, {'role': 'admin'})
+        for group_pk, user_pk in removed:
+            graph.no_edge(users[user_pk], groups[group_pk], member_of, groups[group_pk].site)
+    for group_pk, user_pk in added + removed:
+        membership_changed(users[user_pk], groups[group_pk])
+
+
 @receiver(models.signals.m2m_changed, sender=SocialGroup.administrators.through, dispatch_uid='post_m2m_changed_social_group')
 def post_m2m_changed_social_group(sender, instance, action, reverse, model, pk_set, **kwargs):
+    through = SocialGroup.administrators.through
+    if action == 'pre_clear':
+        # once cleared, there is no way to know which rows were there
+        if reverse:
+            instance._cleared_pks = list(through.objects.filter(user=instance.pk).values_list(
+                'socialgroup_id', flat=True
+            ))
+        else:
+            instance._cleared_pks = list(through.objects.filter(socialgroup=instance.pk).values_list(
+                'user_id', flat=True
+            ))
+        return
     if action not in ('post_add', 'post_remove', 'post_clear'):
         return
-    member_of = member_of_edge()
+    pks = instance.__dict__.pop('_cleared_pks', []) if action == 'post_clear' else pk_set
     if not reverse:  # the call has modified the direct relationship SocialGroup.administrators
-        group = instance
-        if action == 'post_clear':
-            for admin in group.specific_role_member_list('admin'):
-                graph.no_edge(admin, group, member_of, group.site)
-        else:
-            admins = model.objects.filter(pk__in=list(pk_set))
-            if action == 'post_add':
-                for admin in admins:
-                    graph.edge(admin, group, member_of, group.site, {'role': 'admin'})
-            elif action == 'post_remove':
-                for admin in admins:
-                    graph.no_edge(admin, group, member_of, group.site)
+        invalidate_administrators(instance)
+        sync_admin_edges([instance.pk], pks)
     else:  # the call has modified the reverse relationship: User.groups_administrated_by
-        admin = instance
-        if action == 'post_clear':
-            for group in admin.specific_role_social_group_list('admin'):
-                graph.no_edge(admin, group, member_of, group.site)
-        else:
-            groups = model.objects.filter(pk__in=list(pk_set))
-            if action == 'post_add':
-                for group in groups:
-                    graph.edge(admin, group, member_of, group.site, {'role': 'admin'})
-            elif action == 'post_remove':
-                for group in groups:
-                    graph.no_edge(admin, group, member_of, group.site)
+        sync_admin_edges(pks, [instance.pk])
 
 
 class GroupMembershipRequest(models.Model):
@@ -479,7 +671,68 @@ def post_save_group_membership_request(sender, instance, created, **kwargs):
         )
 
 
-class GroupPost(models.Model):
+class GroupPostManager(models.Manager):
+
+    def share(self, creator, group_pks, comment, url='', image=None):
+        """
+        Posts the same content to many groups at once. The groups are fetched with one query, the posts, their events
+        and their feed items are inserted in batches, all of it in a single transaction. Returns the created posts.
+
+        post_save isn't sent for these posts. social_group_post_created is sent for each of them, with bulk=True: their
+        events are created already. If the group post event type notifies through other transports than the group
+        feed, the posts are created one by one, so those transports are used as usual.
+        """
+        groups = SocialGroup.objects.in_bulk([int(pk) for pk in group_pks])
+        event_type = group_post_event_type()
+        template_config = NotificationTemplateConfig.objects.filter(
+            event_type=event_type, transport__cls='social_network.transports.GroupFeedTransport'
+        ).first()
+        if template_config is None or EventAttendantsConfig.objects.filter(event_type=event_type).exclude(
+            transport=template_config.transport_id
+        ).exists():
+            with atomic():
+                return [self.create(creator=creator, group=group, comment=comment, url=url, image=image)
+                        for group in groups.values()]
+
+        with atomic():
+            # bulk_create doesn't return pks: the new rows are read back, above the previous last pk. Locking the
+            # creator keeps a concurrent share of theirs (a double submitted form) out of that range.
+            User.objects.select_for_update().filter(pk=creator.pk).exists()
+            last_post = self.aggregate(last=Max('pk'))['last'] or 0
+            self.bulk_create([self.model(creator=creator, group=group, comment=comment, url=url, image=image)
+                              for group in groups.values()])
+            posts = list(self.filter(pk__gt=last_post, creator=creator, group__in=groups.keys()).order_by('pk'))
+            if len(posts) != len(groups):
+                raise IntegrityError("The shared posts couldn't be read back.")
+
+            post_type = ContentType.objects.get_for_model(self.model)
+            details = force_text(_(u'A new post has been added to a group'))
+            site_id = current_site().pk
+            last_event = Event.objects.aggregate(last=Max('pk'))['last'] or 0
+            Event.objects.bulk_create([
+                Event(type=event_type, target_type=post_type, target_pk=str(post.pk), user=creator, details=details,
+                      site_id=site_id)
+                for post in posts
+            ])
+            events = Event.objects.filter(
+                pk__gt=last_event, target_type=post_type, target_pk__in=[str(post.pk) for post in posts]
+            )
+            posts_by_pk = dict((post.pk, post) for post in posts)
+            GroupFeedItem.objects.bulk_create([
+                GroupFeedItem(
+                    group_id=posts_by_pk[int(event.target_pk)].group_id, event=event, template_config=template_config,
+                    date=event.date, post_id=int(event.target_pk), site_id=site_id
+                )
+                for event in events
+            ])
+        if posts:
+            ensure_derivatives(posts[0].image)
+        for post in posts:
+            send(social_group_post_created, sender=self.model, user=creator, instance=post, bulk=True)
+        return posts
+
+
+class GroupPost(models.Model, ImageDerivativesMixin):
     creator = models.ForeignKey(User, related_name='posts', verbose_name=_(u'creator'))
     group = models.ForeignKey(SocialGroup, related_name='posts', verbose_name=_(u'group'))
     comment = models.TextField(_(u'comment'), help_text=_(u"Share something with the group"))
@@ -494,6 +747,15 @@ class GroupPost(models.Model):
 
     image = models.ImageField(_(u'cover image'), upload_to=images_upload, null=True, blank=True, max_length=500)
 
+    # link preview, filled in the background (see social_network.previews) for preview_url
+    preview_url = models.URLField(_(u'preview url'), blank=True, editable=False)
+    preview_title = models.CharField(_(u'preview title'), max_length=255, blank=True, editable=False)
+    preview_description = models.TextField(_(u'preview description'), blank=True, editable=False)
+    preview_image = models.URLField(_(u'preview image'), max_length=500, blank=True, editable=False)
+    preview_site_name = models.CharField(_(u'preview site name'), max_length=100, blank=True, editable=False)
+
+    objects = GroupPostManager()
+
     class Meta(object):
         verbose_name = _(u'group post')
         verbose_name_plural = _(u'group posts')
@@ -506,34 +768,59 @@ class GroupPost(models.Model):
     def get_delete_url(self):
         return 'group:delete_post', [], {'slug': self.group.slug, 'pk': self.pk}
 
+    @property
+    def has_preview(self):
+        return bool(self.url) and self.preview_url == self.url and bool(self.preview_title)
+
+    def update_preview(self):
+        """
+        Queues the fetching of the link preview, if previews are on and the url has changed since the last one.
+        """
+        from previews import LINK_PREVIEWS
+        if LINK_PREVIEWS and self.url and self.url != self.preview_url:
+            from tasks import fetch_link_preview
+            run_task(fetch_link_preview, (self.pk,))
+
 
 @receiver(models.signals.post_save, sender=GroupPost, dispatch_uid='post_save_group_post')
 def post_save_group_post(sender, instance, created, **kwargs):
+    ensure_derivatives(instance.image)
     if created:
-        social_group_post_created.send(sender=GroupPost, user=instance.creator, instance=instance)
+        send(social_group_post_created, sender=GroupPost, user=instance.creator, instance=instance)
     else:
-        import datetime
-        feed_item = GroupFeedItem.objects.get(event__target_pk=instance.pk)
-        feed_item.event.date = datetime.datetime.now()
-        feed_item.event.save()
+        now = datetime.datetime.now()
+        Event.objects.filter(feed_items__post=instance.pk).update(date=now)
+        # keep the timeline sort key in sync with the event
+        GroupFeedItem.objects.filter(post=instance.pk).update(date=now)
+        bump_post_version(instance.pk)
+        instance.update_preview()
 
 
 @receiver(models.signals.post_delete, sender=GroupPost, dispatch_uid='post_delete_group_post')
 def post_delete_group_post(sender, instance, **kwargs):
+    release_shared_image(instance.image.name, GroupPost)
     social_group_post_deleted.send(sender=GroupPost, instance=instance)
 
 
 @receiver(social_group_post_created, sender=GroupPost, dispatch_uid='social_network_group_post')
-def social_network_group_post(instance, user, **kwargs):
+def social_network_group_post(instance, user, bulk=False, **kwargs):
+    if bulk:
+        # created along with the posts, see GroupPostManager.share
+        return
     from notifications import create_event
     create_event(user, group_post_event_type(), instance, _(u'A new post has been added to a group'))
 
 
+@receiver(social_group_post_created, sender=GroupPost, dispatch_uid='social_network_group_post_preview')
+def social_network_group_post_preview(instance, **kwargs):
+    instance.update_preview()
+
+
 @receiver(social_group_post_deleted, sender=GroupPost, dispatch_uid='social_network_group_post_deleted')
 def social_network_group_post_deleted(instance, **kwargs):
-    feed_item = GroupFeedItem.objects.get(event__target_pk=instance.pk)
-    feed_item.erased = True
-    feed_item.save()
+    # the link is cleared, the pk of the post may be reused by a new one
+    GroupFeedItem.objects.filter(post=instance.pk).update(erased=True, post=None)
+    bump_post_version(instance.pk)
 
 
 class GroupFeedItemQuerySet(models.query.QuerySet):
@@ -541,12 +828,80 @@ class GroupFeedItemQuerySet(models.query.QuerySet):
     def active(self):
         return self.filter(erased=False)
 
+    def for_display(self):
+        """
+        Fetches along with the items everything rendering them needs: the event, its user, the template config and
+        the group in the same query, and the event targets (the posts) with one query per target type.
+        """
+        return self.select_related('event__user', 'template_config', 'group').prefetch_related('event__target_object')
+
+    def page(self, cursor=None, limit=20):
+        """
+        Returns a page of feed items, newest first, along with the cursor of the next page (None if this is the last
+        one). Filtered by group, this is a range scan over the (group, erased, date) index.
+        """
+        return keyset_page(self, 'date', cursor, limit)
+
+    def merged_page(self, group_ids, cursor=None, limit=20):
+        """
+        Returns a page of the feed items of all the given groups, newest first, k-way merging the per group
+        timelines, along with the cursor of the next page (None if this is the last one).
+
+        One aggregate query finds the newest item of each group, then a group's timeline is only read when the
+        merge reaches it, and never for more items than the page still needs. So at most limit + 2 queries are
+        made, no matter how many groups or items there are (plus the prefetches, done once for the whole page).
+        """
+        lookups = self._prefetch_related_lookups
+        queryset = self.prefetch_related(None)
+        if cursor is not None:
+            time, pk = cursor
+            queryset = queryset.filter(Q(date__lt=time) | Q(date=time, pk__lt=pk))
+        heads = queryset.filter(group__in=group_ids).order_by().values_list('group').annotate(head=Max('date'))
+
+        # heap entries are (key, group id, item); item None is a placeholder for a timeline not read yet
+        heap = [((_timeline_key(head, 0)[0], float('-inf')), group_id, None) for group_id, head in heads]
+        heapq.heapify(heap)
+        timelines = {}
+        items = []
+        while heap and len(items) <= limit:
+            key, group_id, item = heapq.heappop(heap)
+            if item is None:
+                timelines[group_id] = iter(queryset.filter(group=group_id).order_by('-date', '-id')[
+                    :limit + 1 - len(items)
+                ])
+            else:
+                items.append(item)
+            following = next(timelines[group_id], None)
+            if following is not None:
+                heapq.heappush(heap, (_timeline_key(following.date, following.pk), group_id, following))
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = items[-1].date, items[-1].pk
+        if lookups:
+            prefetch_related_objects(items, lookups)
+        return items, next_cursor
+
+
+def _timeline_key(date, pk):
+    # heapq pops the smallest key first, the newest item must have the smallest key
+    if timezone.is_aware(date):
+        date = timezone.make_naive(date, timezone.utc)
+    return -(date - datetime.datetime(1970, 1, 1)).total_seconds(), -pk
+
 
 class GroupFeedItemManagerMixin(object):
 
     def active(self):
         return self.get_queryset().active()
 
+    def for_display(self):
+        return self.get_queryset().for_display()
+
+    def merged_page(self, group_ids, cursor=None, limit=20):
+        return self.get_queryset().merged_page(group_ids, cursor, limit)
+
 
 class GroupFeedItemManager(GroupFeedItemManagerMixin, models.Manager):
 
@@ -561,7 +916,7 @@ class GroupFeedItemCurrentSiteManager(GroupFeedItemManagerMixin, CurrentSiteMana
             self._validate_field_name()
         return GroupFeedItemQuerySet(
             self.model, using=self._db
-        ).filter(**{self._CurrentSiteManager__field_name + '__id__exact': Site.objects.get_current().pk}).active()
+        ).filter(**{self._CurrentSiteManager__field_name + '__id__exact': current_site().pk}).active()
 
 
 class GroupFeedItem(LikableMixin, DenounceTargetMixin, CommentTargetMixin, ShareToSocialNetworkTargetMixin,
@@ -570,6 +925,13 @@ class GroupFeedItem(LikableMixin, DenounceTargetMixin, CommentTargetMixin, Share
     event = models.ForeignKey(Event, related_name='feed_items')
     template_config = models.ForeignKey(NotificationTemplateConfig)
     erased = models.BooleanField(default=False, blank=True)
+    # the post the event is about, when it is one. Erased items outlive their post, so there is no constraint
+    post = models.OneToOneField(
+        GroupPost, related_name='feed_item', null=True, blank=True, editable=False, on_delete=models.DO_NOTHING,
+        db_constraint=False
+    )
+    # copy of event.date, so the group timeline can be sorted without joining the events table
+    date = models.DateTimeField(_(u'date'), default=datetime.datetime.now)
 
     site = models.ForeignKey(Site)
 
@@ -580,12 +942,13 @@ class GroupFeedItem(LikableMixin, DenounceTargetMixin, CommentTargetMixin, Share
     class Meta(object):
         verbose_name = _(u'group feed item')
         verbose_name_plural = _(u'group feed item')
-        ordering = ('-event__date',)
+        ordering = ('-date', '-id')
+        index_together = [('group', 'erased', 'date')]
 
     def __init__(self, *args, **kwargs):
         super(GroupFeedItem, self).__init__(*args, **kwargs)
         if not self.pk and not self.site_id:
-            self.site_id = self.event.site_id or Site.objects.get_current().pk
+            self.site_id = self.event.site_id or current_site().pk
 
     def creator_by(self, user):
         return isinstance(user, GroupFeedItem) and self.event.user.pk == user.pk
@@ -621,3 +984,48 @@ class FeedComment(models.Model):
 def post_save_feed_comment(sender, instance, created, **kwargs):
     if created:
         profile_comment_created.send(sender=FeedComment, user=instance.creator, instance=instance)
+
+
+@local_receiver(follower_relationship_created)
+def count_follower_relationship_created(followed, user, **kwargs):
+    site_id = user.get_site().pk
+    update_counter(followed, FOLLOWERS, site_id, 1)
+    update_counter(user, FOLLOWING, site_id, 1)
+
+
+@local_receiver(follower_relationship_destroyed)
+def count_follower_relationship_destroyed(followed, user, **kwargs):
+    site_id = user.get_site().pk
+    update_counter(followed, FOLLOWERS, site_id, -1)
+    update_counter(user, FOLLOWING, site_id, -1)
+
+
+@local_receiver(friendship_created)
+def count_friendship_created(friend, user, **kwargs):
+    site_id = user.get_site().pk
+    update_counter(friend, FRIENDS, site_id, 1)
+    update_counter(user, FRIENDS, site_id, 1)
+
+
+@local_receiver(social_group_member_added)
+def count_social_group_member_added(group, member, **kwargs):
+    update_counter(group, MEMBERS, group.site_id, 1)
+    update_counter(member, SOCIAL_GROUPS, group.site_id, 1)
+
+
+@local_receiver(social_group_members_added)
+def count_social_group_members_added(group, members, **kwargs):
+    update_counter(group, MEMBERS, group.site_id, len(members))
+    for member in members:
+        update_counter(member, SOCIAL_GROUPS, group.site_id, 1)
+
+
+@local_receiver(social_group_member_added)
+def invalidate_memberships_member_added(member, **kwargs):
+    invalidate_memberships(member)
+
+
+@local_receiver(social_group_members_added)
+def invalidate_memberships_members_added(members, **kwargs):
+    for member in members:
+        invalidate_memberships(member)
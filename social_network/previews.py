@@ -0,0 +1,271 @@
+# coding=utf-8
+"""
+Link previews for group posts.
+
+When ``SOCIAL_NETWORK_LINK_PREVIEWS`` is on and a post with a url is created (or its url is edited), a Celery task fetches the page and extracts its
+OpenGraph metadata (falling back to <title> and the description meta tag), storing it on the post. Templates only
+ever read the stored preview.
+
+Pages are fetched by ``SOCIAL_NETWORK_PREVIEW_FETCHER``, the dotted path of a callable taking a url and returning
+the page html (or None). Previews are cached by normalized url, so a link shared in many posts is fetched once.
+"""
+import hashlib
+import httplib
+import socket
+import ssl
+import struct
+import urllib
+import urllib2
+from HTMLParser import HTMLParser, HTMLParseError
+from urlparse import urljoin, urlsplit, urlunsplit, parse_qsl
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_by_path
+
+# off by default: fetching previews needs a Celery worker (and broker)
+LINK_PREVIEWS = getattr(settings, 'SOCIAL_NETWORK_LINK_PREVIEWS', False)
+PREVIEW_CACHE_TIMEOUT = getattr(settings, 'SOCIAL_NETWORK_PREVIEW_CACHE_TIMEOUT', 60 * 60 * 24 * 7)
+# failed fetches are remembered for a while too, so a dead link isn't fetched for every post sharing it
+PREVIEW_FAILURE_CACHE_TIMEOUT = getattr(settings, 'SOCIAL_NETWORK_PREVIEW_FAILURE_CACHE_TIMEOUT', 60 * 60)
+PREVIEW_FETCH_TIMEOUT = getattr(settings, 'SOCIAL_NETWORK_PREVIEW_FETCH_TIMEOUT', 5)
+PREVIEW_MAX_BYTES = getattr(settings, 'SOCIAL_NETWORK_PREVIEW_MAX_BYTES', 512 * 1024)
+PREVIEW_USER_AGENT = getattr(settings, 'SOCIAL_NETWORK_PREVIEW_USER_AGENT', 'django-social-network link preview')
+
+PREVIEW_FIELDS = {'title': 255, 'description': 1000, 'image': 500, 'site_name': 100}
+
+
+# loopback, private, shared, link-local, multicast and reserved ranges
+BLOCKED_IPV4_NETWORKS = [
+    ('0.0.0.0', 8), ('10.0.0.0', 8), ('100.64.0.0', 10), ('127.0.0.0', 8), ('169.254.0.0', 16), ('172.16.0.0', 12),
+    ('192.0.0.0', 24), ('192.168.0.0', 16), ('198.18.0.0', 15), ('224.0.0.0', 4), ('240.0.0.0', 4),
+]
+
+
+def _ipv4_int(address):
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def is_public_address(address):
+    """
+    Whether an IP address (v4 or v6) is publicly routable.
+    """
+    if ':' in address:
+        packed = socket.inet_pton(socket.AF_INET6, address.split('%', 1)[0])
+        if packed[:12] == '\x00' * 10 + '\xff' * 2:
+            # IPv4 mapped
+            return is_public_address(socket.inet_ntoa(packed[12:]))
+        first = ord(packed[0])
+        return not (
+            packed[:15] == '\x00' * 15 or  # unspecified and loopback
+            first & 0xfe == 0xfc or  # unique local
+            first == 0xfe and ord(packed[1]) & 0xc0 in (0x80, 0xc0) or  # link and site local
+            first == 0xff  # multicast
+        )
+    value = _ipv4_int(address)
+    return not any(value >> (32 - bits) == _ipv4_int(network) >> (32 - bits) for network, bits in BLOCKED_IPV4_NETWORKS)
+
+
+def resolve(host, port):
+    """
+    Returns the addresses host resolves to.
+    """
+    return [sockaddr[0] for family, socktype, proto, canonname, sockaddr in socket.getaddrinfo(
+        host, port, 0, socket.SOCK_STREAM
+    )]
+
+
+def check_url(url):
+    """
+    Raises ValueError unless url is http(s) and its host only resolves to public addresses, so users can't make
+    the server fetch internal hosts (cloud metadata endpoints, services on the private network...). Returns the
+    address to connect to: connecting to it, instead of resolving the host again, keeps DNS rebinding out.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError("Only http and https urls are fetched: %r" % url)
+    try:
+        addresses = resolve(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+    except socket.error:
+        raise ValueError("%r can't be resolved." % parts.hostname)
+    if not addresses:
+        raise ValueError("%r can't be resolved." % parts.hostname)
+    for address in addresses:
+        if not is_public_address(address):
+            raise ValueError("%r resolves to a non public address." % parts.hostname)
+    return addresses[0]
+
+
+class PinnedHTTPConnection(httplib.HTTPConnection):
+    """
+    Connects to pinned_address instead of resolving the host; the Host header is still the host's.
+    """
+    pinned_address = None
+
+    def connect(self):
+        self.sock = socket.create_connection((self.pinned_address, self.port), self.timeout)
+
+
+class PinnedHTTPSConnection(httplib.HTTPSConnection):
+    pinned_address = None
+
+    def connect(self):
+        sock = socket.create_connection((self.pinned_address, self.port), self.timeout)
+        # the certificate is checked against the host, not the address
+        self.sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+
+
+def pinned(connection_class, address):
+    def connection(host, **kwargs):
+        instance = connection_class(host, **kwargs)
+        instance.pinned_address = address
+        return instance
+    return connection
+
+
+class PinnedHTTPHandler(urllib2.HTTPHandler):
+
+    def http_open(self, req):
+        return self.do_open(pinned(PinnedHTTPConnection, check_url(req.get_full_url())), req)
+
+
+class PinnedHTTPSHandler(urllib2.HTTPSHandler):
+
+    def https_open(self, req):
+        return self.do_open(pinned(PinnedHTTPSConnection, check_url(req.get_full_url())), req)
+
+
+class CheckedRedirectHandler(urllib2.HTTPRedirectHandler):
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if urlsplit(newurl).scheme not in ('http', 'https'):
+            raise ValueError("Only http and https urls are fetched: %r" % newurl)
+        return urllib2.HTTPRedirectHandler.redirect_request(self, req, fp, code, msg, headers, newurl)
+
+
+def urllib_fetcher(url):
+    """
+    The default fetcher: a GET with a timeout, reading at most PREVIEW_MAX_BYTES of html. Only public http(s) urls
+    are fetched, redirects included, connecting to the checked address and bypassing any environment proxies.
+    """
+    request = urllib2.Request(url, headers={'User-Agent': PREVIEW_USER_AGENT, 'Accept': 'text/html'})
+    opener = urllib2.build_opener(urllib2.ProxyHandler({}), PinnedHTTPHandler, PinnedHTTPSHandler,
+                                  CheckedRedirectHandler)
+    response = opener.open(request, timeout=PREVIEW_FETCH_TIMEOUT)
+    try:
+        if response.info().gettype() not in ('text/html', 'application/xhtml+xml'):
+            return None
+        charset = response.info().getparam('charset') or 'utf-8'
+        return response.read(PREVIEW_MAX_BYTES).decode(charset, 'replace')
+    finally:
+        response.close()
+
+
+def get_fetcher():
+    return import_by_path(getattr(settings, 'SOCIAL_NETWORK_PREVIEW_FETCHER', 'social_network.previews.urllib_fetcher'))
+
+
+def normalize_url(url):
+    """
+    Lower cases scheme and host, drops default ports, fragments and utm_* tracking parameters, and sorts the query.
+    """
+    scheme, netloc, path, query, fragment = urlsplit(url.strip())
+    scheme, netloc = scheme.lower(), netloc.lower()
+    if (scheme, netloc.rsplit(':', 1)[-1]) in (('http', '80'), ('https', '443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    params = sorted((key.encode('utf-8'), value.encode('utf-8'))
+                    for key, value in parse_qsl(query, keep_blank_values=True) if not key.startswith('utm_'))
+    return urlunsplit((scheme, netloc, path or '/', urllib.urlencode(params), ''))
+
+
+class OpenGraphParser(HTMLParser):
+    """
+    Collects the og:* properties, the description meta tag and the title of a page, up to the end of its <head>.
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.properties = {}
+        self.title = None
+        self.in_title = False
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        attrs = dict(attrs)
+        if tag == 'meta':
+            key = attrs.get('property') or attrs.get('name') or ''
+            if attrs.get('content') and (key.startswith('og:') or key == 'description'):
+                self.properties.setdefault(key, attrs['content'])
+        elif tag == 'title':
+            self.in_title = True
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self.in_title = False
+        elif tag in ('head', 'body'):
+            self.done = True
+
+    def handle_data(self, data):
+        if self.in_title and not self.done:
+            self.title = (self.title or '') + data
+
+    def handle_entityref(self, name):
+        self.handle_data(self.unescape('&%s;' % name))
+
+    def handle_charref(self, name):
+        self.handle_data(self.unescape('&#%s;' % name))
+
+
+def extract_preview(html, url):
+    """
+    Returns a dict with the title, description, image and site_name of the page (empty strings for the ones
+    missing), or None if the page has no title at all.
+    """
+    parser = OpenGraphParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except HTMLParseError:
+        pass
+    properties = parser.properties
+    preview = {
+        'title': properties.get('og:title') or parser.title,
+        'description': properties.get('og:description') or properties.get('description'),
+        'image': urljoin(url, properties['og:image']) if properties.get('og:image') else None,
+        'site_name': properties.get('og:site_name'),
+    }
+    if not preview['title'] or not preview['title'].strip():
+        return None
+    return dict((key, (value or u'').strip()[:PREVIEW_FIELDS[key]]) for key, value in preview.items())
+
+
+def get_preview(url):
+    """
+    Returns the preview of url, fetching it unless it is cached already (by normalized url). None if the page
+    couldn't be fetched or has no title.
+    """
+    normalized = normalize_url(url)
+    key = 'social_network:preview:%s' % hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached or None
+    try:
+        html = get_fetcher()(url)
+        preview = extract_preview(html, url) if html else None
+    except Exception:
+        preview = None
+    cache.set(key, preview or {}, PREVIEW_CACHE_TIMEOUT if preview else PREVIEW_FAILURE_CACHE_TIMEOUT)
+    return preview
+
+
+def store_preview(post):
+    """
+    Fetches (or reads from the cache) the preview of the post url and saves it on the post.
+    """
+    preview = get_preview(post.url) or dict((key, u'') for key in PREVIEW_FIELDS)
+    fields = dict(('preview_%s' % key, value) for key, value in preview.items())
+    fields['preview_url'] = post.url
+    post.__class__.objects.filter(pk=post.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(post, name, value)
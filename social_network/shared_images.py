@@ -0,0 +1,48 @@
+# coding=utf-8
+"""
+Content addressed storage for the images shared to several groups at once.
+
+A shared image already stored (a committed FieldFile) is simply referenced by name. Any other file is stored once
+under the hash of its bytes (``shared/<hash[:2]>/<hash>.<ext>``), so sharing the same picture again, to any number
+of groups, doesn't write it again. A content addressed file is deleted along with the last post referencing it.
+"""
+import hashlib
+import os
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+SHARED_IMAGES_PREFIX = 'shared/'
+
+
+def content_name(content, filename):
+    digest = hashlib.sha1()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    extension = os.path.splitext(filename)[1].lower()
+    hash_string = digest.hexdigest()
+    return '%s%s/%s%s' % (SHARED_IMAGES_PREFIX, hash_string[:2], hash_string, extension)
+
+
+def store_shared_image(picture, storage=default_storage):
+    """
+    Returns the storage name to reference picture with, storing it first if needed. Returns None if there is no
+    picture.
+    """
+    if not picture:
+        return None
+    if getattr(picture, '_committed', False):
+        return picture.name
+    name = content_name(picture, picture.name or '')
+    if not storage.exists(name):
+        picture.seek(0)
+        name = storage.save(name, ContentFile(picture.read()))
+    return name
+
+
+def release_shared_image(name, model, storage=default_storage):
+    """
+    Deletes a content addressed image once no instance of model references it anymore.
+    """
+    if name and name.startswith(SHARED_IMAGES_PREFIX) and not model.objects.filter(image=name).exists():
+        storage.delete(name)
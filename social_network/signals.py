@@ -8,10 +8,11 @@ follower_relationship_created = Signal(providing_args=['followed', 'user'])
 follower_relationship_destroyed = Signal(providing_args=['followed', 'user'])
 
 social_group_created = Signal(providing_args=['instance', 'user'])
-social_group_post_created = Signal(providing_args=['instance', 'user'])
+social_group_post_created = Signal(providing_args=['instance', 'user', 'bulk'])
 social_group_post_deleted = Signal(providing_args=['instance'])
 social_group_membership_request_created = Signal(providing_args=['instance', 'user', 'group'])
 social_group_member_added = Signal(providing_args=['group', 'member', 'user'])
+social_group_members_added = Signal(providing_args=['group', 'members', 'user'])
 
 profile_comment_created = Signal(providing_args=['instance', 'user'])
 
@@ -0,0 +1,49 @@
+# coding=utf-8
+import logging
+from celery import shared_task
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import get_model
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def dispatch_signal(signal_name, sender, payload):
+    """
+    Sends a social network signal from a worker, see ``social_network.dispatch``. The instances are loaded back by
+    pk. Tasks are queued after commit, so a missing instance was deleted meanwhile: the signal is dropped, logged.
+    """
+    import signals
+    from dispatch import deserialize
+    try:
+        kwargs = dict((key, deserialize(value)) for key, value in payload.items())
+    except ObjectDoesNotExist:
+        logger.warning("%s dropped, an instance it is about was deleted: %r", signal_name, payload, exc_info=True)
+        return
+    getattr(signals, signal_name).send(sender=get_model(*sender.split('.')), **kwargs)
+
+
+@shared_task(ignore_result=True)
+def apply_follow_toggles(follower_pk, followed_pk, site_id):
+    from follows import apply_pending_toggles
+    apply_pending_toggles(follower_pk, followed_pk, site_id)
+
+
+@shared_task(ignore_result=True)
+def fetch_link_preview(post_pk):
+    from fragments import bump_post_version
+    from models import GroupPost
+    from previews import store_preview
+    try:
+        post = GroupPost.objects.get(pk=post_pk)
+    except GroupPost.DoesNotExist:
+        # deleted meanwhile
+        return
+    store_preview(post)
+    bump_post_version(post.pk)
+
+
+@shared_task(ignore_result=True)
+def generate_image_derivatives(name):
+    from derivatives import generate_derivatives
+    generate_derivatives(name)
@@ -1,13 +1,15 @@
 # coding=utf-8
-from django.conf import settings
 from django import template
 from django.contrib.auth.models import User
 from django.utils.translation import ugettext as _
+from .. import embeds
+from ..fragments import POST_FRAGMENT_TIMEOUT, post_version
+from ..middleware import resolve
 from ..models import FriendRequest, SocialGroup, GroupMembershipRequest
+from ..relationships import RelationshipResolver, prefetched_state
 from ..utils import intmin as intmin_function
 
 register = template.Library()
-FORMAT_LIST = getattr(settings, 'IMAGES_FORMAT_LIST', ['jpeg', 'jpg', 'png', 'gif'])
 
 
 @register.filter(is_safe=False)
@@ -23,10 +25,42 @@ def process_user_param(user):
     if isinstance(user, User):
         return user
     else:
-        try:
-            return User.objects.get(username=user)
-        except:
-            return False
+        def load():
+            try:
+                return User.objects.get(username=user)
+            except:
+                return False
+        return resolve(('user', user), load)
+
+
+def relationship_state(user1, user2):
+    """
+    Returns the prefetched RelationshipState between both users, seen from whichever of them is the viewer,
+    along with a flag telling whether user1 is that viewer. Returns (None, None) if nothing was prefetched.
+    """
+    state = prefetched_state(user1, user2)
+    if state is not None:
+        return state, True
+    state = prefetched_state(user2, user1)
+    if state is not None:
+        return state, False
+    return None, None
+
+
+@register.simple_tag
+def prefetch_relationships(viewer, users):
+    """
+    Resolves the relationships between viewer and every user in users in a constant number of queries, so that
+    the relationship filters used afterwards for these users don't hit the database.
+
+    :param viewer: An User instance.
+    :param users: An iterable of User instances.
+
+    """
+    viewer = process_user_param(viewer)
+    if viewer:
+        RelationshipResolver(viewer, users).attach()
+    return ''
 
 # --------------------------------------FOLLOWER TAGS---------------------------------------------
 
@@ -40,6 +74,9 @@ def followed_by(user1, user2):
     user2 = process_user_param(user2)
     if not user1 or not user2:
         return False
+    state, from_user1 = relationship_state(user1, user2)
+    if state is not None:
+        return state.followed_by if from_user1 else state.follows
     return user1.followed_by(user2)
 
 
@@ -56,6 +93,9 @@ def is_follower_of(user1, user2):
     user2 = process_user_param(user2)
     if not user1 or not user2:
         return False
+    state, from_user1 = relationship_state(user1, user2)
+    if state is not None:
+        return state.follows if from_user1 else state.followed_by
     return user2.followed_by(user1)
 
 
@@ -98,6 +138,9 @@ def is_friends_with(user1, user2):
     user2 = process_user_param(user2)
     if not user1 or not user2:
         return False
+    state, from_user1 = relationship_state(user1, user2)
+    if state is not None:
+        return state.friends
     return user1.friend_of(user2)
 
 
@@ -114,6 +157,9 @@ def has_requested_friendship_to(user1, user2):
     user2 = process_user_param(user2)
     if not user1 or not user2 or user1 == user2:
         return False
+    state, from_user1 = relationship_state(user1, user2)
+    if state is not None:
+        return state.requested_friendship if from_user1 else state.requested_by
     return FriendRequest.objects.filter(from_user=user1, to_user=user2, accepted=False).exists()
 
 
@@ -139,10 +185,12 @@ def process_group_param(group):
     if isinstance(group, SocialGroup):
         return group
     else:
-        try:
-            return SocialGroup.objects.get(slug=group)
-        except:
-            return False
+        def load():
+            try:
+                return SocialGroup.objects.get(slug=group)
+            except:
+                return False
+        return resolve(('group', group), load)
 
 
 role_dict = {
@@ -239,7 +287,20 @@ def has_requested_membership(user, group):
 
 @register.simple_tag()
 def render_user_rol(user, group):
-    return role_dict[group.member_role_list[user.pk]]
+    """
+    Returns the display name of the role of user in group.
+
+    Uses the ``group_role`` attribute set on the user by SocialGroupMembersList when available, and a single
+    edge lookup otherwise.
+
+    :param user: An User instance.
+    :param group: A SocialGroup instance.
+
+    """
+    role = getattr(user, 'group_role', None)
+    if role is None:
+        role = group.relationship_with(user)[1]
+    return role_dict.get(role, '')
 
 
 @register.filter
@@ -253,26 +314,21 @@ def groups_count(user):
     return user_obj.social_groups()
 
 
+@register.assignment_tag
+def post_fragment(item):
+    """
+    Returns the timeout and the content version to cache the shared part of a feed item with:
+
+        {% post_fragment item as fragment %}
+        {% cache fragment.timeout social_network_post item.pk fragment.version LANGUAGE_CODE %}...{% endcache %}
+
+    Returns None if there is no item (its event wasn't delivered to the group feed yet).
+    """
+    if item is None:
+        return None
+    return {'timeout': POST_FRAGMENT_TIMEOUT, 'version': post_version(item.post_id)}
+
+
 @register.simple_tag
 def render_url(url):
-    import re
-    youtube_url_regex = re.compile(ur'(?:https?:\/\/)?(?:www\.)?youtu\.?be(?:\.com)?\/?.*(?:watch|embed)?(?:.*v=|v\/|\/)([\w\-&=]+)', re.MULTILINE | re.IGNORECASE)
-    youtube_id_regex = re.compile(
-        ur'(?:https?:\/\/)?(?:[0-9A-Z-]+\.)?(?:youtube|youtu|youtube-nocookie)\.(?:com|be)\/(?:watch\?v=|watch\?vi=|watch\?.+&v=|watch\?.+&vi=|embed\/|v\/|vi\/|\?v=|\?vi=|.+\?v=|.+\?vi=)?([^&=\n%\?]{11})',
-        re.MULTILINE | re.IGNORECASE
-    )
-
-    default = '<a rel="nofollow" href="{0}" target="_blank">{1}</a>'.format(url, url)
-    try:
-        if youtube_url_regex.match(url):
-            youtube_id = youtube_id_regex.search(url).groups()[0]
-            return '<iframe width="100%" height="315" src="http://www.youtube.com/embed/{0}"></iframe>'.format(youtube_id)
-        else:
-            url_splitted = url.split('.')
-
-            if url_splitted[len(url_splitted) - 1].lower() in FORMAT_LIST:
-                return '<img src="{0}" class="img-responsive" style="width:100%" alt="{1}"/>'.format(url, url)
-
-            return default
-    except Exception:
-        return default
+    return embeds.render_url(url)
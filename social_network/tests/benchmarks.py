@@ -0,0 +1,211 @@
+# coding=utf-8
+"""
+Micro benchmarks. They are not collected by the default test run, use:
+
+    python manage.py test social_network.tests.benchmarks
+
+"""
+import timeit
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+
+def report(title, results):
+    print('\n%s' % title)
+    for label, seconds in results:
+        print('    %-45s %10.2f us' % (label, seconds * 1000000))
+
+
+class TypeRegistryBenchmark(TestCase):
+    # edge/event type lookups done while rendering a group page with a post form and a member list
+    LOOKUPS_PER_REQUEST = 12
+    REQUESTS = 2000
+
+    def test_type_lookups(self):
+        from social_graph import EdgeType
+        from social_network.utils import edge_types, friendship_edge, integrated_by_edge, member_of_edge
+
+        names = ["Friendship", "Integrated by", "Member"]
+        for name in names:
+            cache.set('BENCHMARK_%s' % name, EdgeType.objects.get(name=name))
+
+        def cached_request():
+            for i in range(self.LOOKUPS_PER_REQUEST):
+                cache.get('BENCHMARK_%s' % names[i % len(names)])
+
+        lookups = (friendship_edge, integrated_by_edge, member_of_edge)
+
+        def registry_request():
+            for i in range(self.LOOKUPS_PER_REQUEST):
+                lookups[i % len(lookups)]()
+
+        edge_types.load()
+        cached = timeit.timeit(cached_request, number=self.REQUESTS) / self.REQUESTS
+        registry = timeit.timeit(registry_request, number=self.REQUESTS) / self.REQUESTS
+        report('Edge type lookups per request (%s lookups)' % self.LOOKUPS_PER_REQUEST, [
+            ('django.core.cache (%s)' % cache.__class__.__name__, cached),
+            ('process-local registry', registry),
+            ('saved per request', cached - registry),
+        ])
+        self.assertLess(registry, cached)
+
+
+def power_law_graph(nodes, edges_per_node, seed=1):
+    """
+    Builds an undirected Barabasi-Albert graph, returning a dict mapping each node to its sorted neighbour array.
+    """
+    import random
+    from collections import defaultdict
+    from social_network.friends import sorted_ids
+    rnd = random.Random(seed)
+    neighbours = defaultdict(set)
+    targets = range(edges_per_node)
+    repeated = []
+    for node in range(edges_per_node, nodes):
+        for target in set(targets):
+            neighbours[node].add(target)
+            neighbours[target].add(node)
+        repeated.extend(targets)
+        repeated.extend([node] * edges_per_node)
+        targets = [rnd.choice(repeated) for i in range(edges_per_node)]
+    return dict((node, sorted_ids(ids)) for node, ids in neighbours.iteritems())
+
+
+class FriendSuggestionsBenchmark(TestCase):
+    # loaded into the edge table through the graph, so keep it small enough to load in a minute or two
+    NODES = 3000
+    EDGES_PER_NODE = 4
+    RUNS = 5
+
+    def test_suggestions(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.db.transaction import atomic
+        from social_graph import Graph
+        from social_network.utils import friendship_edge
+        graph = power_law_graph(self.NODES, self.EDGES_PER_NODE)
+        User.objects.bulk_create([User(username='node%s' % node) for node in graph])
+        users = dict((int(user.username[4:]), user) for user in User.objects.filter(username__startswith='node'))
+        friendship, site = friendship_edge(), users[0].get_site()
+        with atomic():
+            for node, neighbours in graph.iteritems():
+                for neighbour in neighbours:
+                    if node < neighbour:
+                        Graph().edge(users[node], users[neighbour], friendship, site, {})
+        by_degree = sorted(graph, key=lambda node: len(graph[node]))
+        hub, median = users[by_degree[-1]], users[by_degree[len(by_degree) / 2]]
+        uncapped = {'max_friends': self.NODES, 'max_edges': self.NODES * self.NODES, 'max_per_friend': self.NODES}
+        capped = {'max_friends': 50, 'max_edges': 2000, 'max_per_friend': 100}
+
+        results = []
+        for label, user in (('hub (degree %s)' % len(graph[by_degree[-1]]), hub),
+                            ('median user (degree %s)' % len(graph[by_degree[len(by_degree) / 2]]), median)):
+            for caps_label, caps in (('uncapped', uncapped), ('capped', capped)):
+                with CaptureQueriesContext(connection) as queries:
+                    user.friend_suggestions(**caps)
+                seconds = timeit.timeit(lambda: user.friend_suggestions(**caps), number=self.RUNS) / self.RUNS
+                results.append(('suggestions, %s, %s, %s queries' % (label, caps_label, len(queries)), seconds))
+        seconds = timeit.timeit(lambda: hub.mutual_friend_count(median), number=self.RUNS * 10) / (self.RUNS * 10)
+        results.append(('mutual friends hub/median', seconds))
+        report('User.friend_suggestions on a %s nodes power-law graph' % self.NODES, results)
+
+
+class AdminCheckBenchmark(TestCase):
+    ADMINS = 300
+    RUNS = 200
+
+    def test_has_admin(self):
+        from social_network.models import SocialGroup
+        creator = User.objects.create(username='creator')
+        group = SocialGroup.objects.create(creator=creator, name='Big Group', description='Big')
+        admins = [User.objects.create(username='admin%s' % i) for i in range(self.ADMINS)]
+        # straight to the m2m table, the graph edges are irrelevant here
+        SocialGroup.administrators.through.objects.bulk_create([
+            SocialGroup.administrators.through(socialgroup=group, user=admin) for admin in admins
+        ])
+        outsider = User.objects.create(username='outsider')
+
+        def scan(user):
+            fresh = SocialGroup.objects.get(pk=group.pk)
+            return user == fresh.creator or user in fresh.administrators.all()
+
+        def exists(user):
+            fresh = SocialGroup.objects.get(pk=group.pk)
+            return user.pk == fresh.creator_id or fresh.administrators.filter(pk=user.pk).exists()
+
+        def cached(user):
+            return SocialGroup.objects.get(pk=group.pk).has_admin(user)
+
+        results = []
+        for label, check in (('administrators.all() scan', scan), ('exists() query', exists),
+                             ('cached administrator set', cached)):
+            for who, user in (('last admin', admins[-1]), ('non admin', outsider)):
+                self.assertEqual(check(user), user is not outsider)
+                seconds = timeit.timeit(lambda: check(user), number=self.RUNS) / self.RUNS
+                results.append(('%s, %s' % (label, who), seconds))
+        report('has_admin on a group with %s administrators (includes fetching the group)' % self.ADMINS, results)
+
+
+def legacy_render_url(url):
+    # render_url as it was before social_network.embeds, compiling its patterns on every call
+    import re
+    from social_network.embeds import FORMAT_LIST
+    youtube_url_regex = re.compile(ur'(?:https?:\/\/)?(?:www\.)?youtu\.?be(?:\.com)?\/?.*(?:watch|embed)?(?:.*v=|v\/|\/)([\w\-&=]+)', re.MULTILINE | re.IGNORECASE)
+    youtube_id_regex = re.compile(
+        ur'(?:https?:\/\/)?(?:[0-9A-Z-]+\.)?(?:youtube|youtu|youtube-nocookie)\.(?:com|be)\/(?:watch\?v=|watch\?vi=|watch\?.+&v=|watch\?.+&vi=|embed\/|v\/|vi\/|\?v=|\?vi=|.+\?v=|.+\?vi=)?([^&=\n%\?]{11})',
+        re.MULTILINE | re.IGNORECASE
+    )
+    default = '<a rel="nofollow" href="{0}" target="_blank">{1}</a>'.format(url, url)
+    try:
+        if youtube_url_regex.match(url):
+            youtube_id = youtube_id_regex.search(url).groups()[0]
+            return '<iframe width="100%" height="315" src="http://www.youtube.com/embed/{0}"></iframe>'.format(youtube_id)
+        url_splitted = url.split('.')
+        if url_splitted[len(url_splitted) - 1].lower() in FORMAT_LIST:
+            return '<img src="{0}" class="img-responsive" style="width:100%" alt="{1}"/>'.format(url, url)
+        return default
+    except Exception:
+        return default
+
+
+class RenderUrlBenchmark(TestCase):
+    URLS = [
+        'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+        'https://youtu.be/9bZkp7q19f0',
+        'http://www.youtube.com/watch?feature=player_embedded&v=kJQP7kiw5Fk',
+        'https://www.youtube.com/embed/JGwWNGJdvx8?rel=0',
+        'https://vimeo.com/76979871',
+        'https://player.vimeo.com/video/148751763',
+        'https://cdn.example.com/media/2014/03/holidays.jpg',
+        'http://i.imgur.com/0ZbZ4Ho.png',
+        'https://example.org/uploads/clip.mp4',
+        'http://www.example.com/news/2014/11/17/local-library-reopens.html',
+        'https://en.wikipedia.org/wiki/Social_network',
+        'https://github.com/suselrd/django-social-network',
+    ]
+    # a feed page renders the same handful of urls over and over
+    RENDERS = 20 * 200
+
+    def test_render_url(self):
+        from social_network.embeds import resolver, render_url
+        urls = [self.URLS[i % len(self.URLS)] for i in range(self.RENDERS)]
+
+        def legacy():
+            for url in urls:
+                legacy_render_url(url)
+
+        def uncached():
+            for url in urls:
+                resolver.render(url)
+
+        def cached():
+            for url in urls:
+                render_url(url)
+
+        results = []
+        for label, run in (('inline compiled patterns (legacy)', legacy), ('resolver, no memoization', uncached),
+                           ('resolver, LRU memoized', cached)):
+            results.append((label, timeit.timeit(run, number=1) / self.RENDERS))
+        report('render_url over %s renders of %s distinct urls (per render)' % (self.RENDERS, len(self.URLS)), results)
+        self.assertLess(results[2][1], results[0][1])
@@ -38,4 +38,763 @@ class GroupTest(TestCase):
 
     def test_group_creation(self):
         logged = self.client.login(username=self.users['user1'].username, password=self.users['user1'].username)
-        self.assertTrue(logged)
\ No newline at end of file
+        self.assertTrue(logged)
+
+
+class RelationshipResolverTest(TestCase):
+
+    def setUp(self):
+        self.viewer = User.objects.create(username='viewer')
+        self.users = [User.objects.create(username='target%s' % i) for i in range(4)]
+
+    def test_resolve(self):
+        from social_network.models import FriendRequest
+        from social_network.relationships import RelationshipResolver
+        self.viewer.follow(self.users[0])
+        self.users[1].follow(self.viewer)
+        self.viewer.make_friend_of(self.users[2])
+        FriendRequest.objects.create(from_user=self.viewer, to_user=self.users[3])
+
+        with self.assertNumQueries(2):
+            states = RelationshipResolver(self.viewer, self.users).resolve()
+
+        self.assertTrue(states[self.users[0].pk].follows)
+        self.assertFalse(states[self.users[0].pk].followed_by)
+        self.assertTrue(states[self.users[1].pk].followed_by)
+        self.assertTrue(states[self.users[2].pk].friends)
+        self.assertTrue(states[self.users[3].pk].requested_friendship)
+        self.assertFalse(states[self.users[3].pk].requested_by)
+
+    def test_prefetched_filters(self):
+        from social_network.models import FriendRequest
+        self.viewer.make_friend_of(self.users[0])
+        FriendRequest.objects.create(from_user=self.users[1], to_user=self.viewer)
+        template = Template(
+            '{% load social_network_tags %}{% prefetch_relationships viewer users %}'
+            '{% for user in users %}{{ viewer|is_friends_with:user }},{{ viewer|has_requested_friendship_to:user }},'
+            '{{ user|has_requested_friendship_to:viewer }},{{ viewer|is_follower_of:user }};{% endfor %}'
+        )
+        with self.assertNumQueries(2):
+            output = template.render(Context({'viewer': self.viewer, 'users': self.users[:3]}))
+        self.assertEqual(output, 'True,False,False,False;False,False,True,False;False,False,False,False;')
+
+    def test_friendship_buttons(self):
+        self.viewer.set_password('viewer')
+        self.viewer.save(update_fields=['password'])
+        self.viewer.make_friend_of(self.users[0])
+        client = Client()
+        client.login(username='viewer', password='viewer')
+        response = client.get(reverse('user:friendship_buttons', args=[self.users[0].username]))
+        self.assertContains(response, 'are friends')
+        response = client.get(reverse('user:friendship_buttons', args=[self.users[1].username]))
+        self.assertContains(response, 'Send Friend Request')
+
+
+class TypeRegistryTest(TestCase):
+
+    def test_lookups_are_served_from_memory(self):
+        from social_network.utils import edge_types, friendship_edge, member_of_edge
+        edge_types.invalidate()
+        with self.assertNumQueries(1):
+            friendship = friendship_edge()
+            member_of = member_of_edge()
+            self.assertEqual(friendship_edge(), friendship)
+        self.assertEqual(friendship.name, "Friendship")
+        self.assertEqual(member_of.name, "Member")
+
+    def test_missing_types_are_looked_up_once(self):
+        from social_graph import EdgeType
+        from social_network.utils import TypeRegistry
+        registry = TypeRegistry(EdgeType, ('Friendship', 'Missing'))
+        with self.assertNumQueries(1):
+            self.assertIsNone(registry.get('Missing'))
+            self.assertIsNone(registry.get('Missing'))
+            self.assertIsNotNone(registry.get('Friendship'))
+        registry.invalidate()
+        with self.assertNumQueries(1):
+            self.assertIsNone(registry.get('Missing'))
+
+    def test_rows_and_misses_expire(self):
+        from social_graph import EdgeType
+        from social_network.utils import TypeRegistry
+        registry = TypeRegistry(EdgeType, ('Friendship', 'Missing'), miss_timeout=0)
+        with self.assertNumQueries(2):
+            registry.get('Missing')
+            registry.get('Missing')
+        registry = TypeRegistry(EdgeType, ('Friendship',), timeout=0)
+        with self.assertNumQueries(2):
+            registry.get('Friendship')
+            registry.get('Friendship')
+
+
+class SocialGroupMembershipTest(TestCase):
+
+    def setUp(self):
+        from social_network.models import SocialGroup
+        self.creator = User.objects.create(username='creator')
+        self.group = SocialGroup.objects.create(creator=self.creator, name='Book Club', description='Books')
+        self.members = [User.objects.create(username='member%s' % i) for i in range(4)]
+        for member in self.members:
+            self.group.add_member(member)
+
+    def test_member_pages(self):
+        from social_network.utils import encode_cursor, decode_cursor
+        seen = []
+        cursor = None
+        while True:
+            members, cursor = self.group.member_page(decode_cursor(encode_cursor(cursor)), 2)
+            self.assertTrue(len(members) <= 2)
+            seen.extend(members)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), len(self.members) + 1)
+        self.assertEqual(dict((user.pk, role) for user, role in seen)[self.creator.pk], 'creator')
+        self.assertEqual(set(user.pk for user, role in seen), set(user.pk for user in self.members + [self.creator]))
+
+    def test_members_of(self):
+        from social_network.models import SocialGroup
+        with self.assertNumQueries(1):
+            members = list(User.objects.members_of(self.group).order_by('username'))
+        self.assertEqual(members, sorted(self.members + [self.creator], key=lambda user: user.username))
+        self.assertEqual(list(SocialGroup.objects.integrated_by(self.members[0])), [self.group])
+
+    def test_membership_checks(self):
+        from social_network.models import SocialGroup
+        user = User.objects.create(username='outsider')
+        with self.assertNumQueries(1):
+            self.assertFalse(self.group.has_member(user))
+            self.assertFalse(user.is_member_of(self.group))
+        self.group.add_member(user)
+        self.assertTrue(self.group.has_member(user))
+        self.assertTrue(User.objects.get(pk=user.pk).is_member_of(self.group))
+        other = SocialGroup.objects.create(creator=self.creator, name='Chess Club', description='Chess')
+        self.assertTrue(other.has_member(self.creator))
+
+    def test_add_members(self):
+        users = [User.objects.create(username='imported%s' % i) for i in range(5)]
+        added = self.group.add_members(users + self.members[:1], batch_size=2)
+        self.assertEqual(added, 5)
+        for user in users:
+            self.assertTrue(self.group.has_member(user))
+
+    def test_members_page_roles(self):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from social_network.models import SocialGroup
+        self.group.administrators.add(self.members[0])
+        url = reverse('group:members', kwargs={'slug': self.group.slug})
+        client = Client()
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        for i in range(10):
+            self.group.add_member(User.objects.create(username='late%s' % i))
+
+        def scan(*args):
+            raise AssertionError("The members page must not scan the group.")
+        member_role_list, SocialGroup.member_role_list = SocialGroup.member_role_list, property(scan)
+        relationship_with, SocialGroup.relationship_with = SocialGroup.relationship_with, scan
+        try:
+            # the same queries, whatever the number of members on the page
+            with self.assertNumQueries(len(queries)):
+                response = client.get(url)
+        finally:
+            SocialGroup.member_role_list, SocialGroup.relationship_with = member_role_list, relationship_with
+        roles = [user.group_role for user in response.context['object_list']]
+        self.assertEqual(len(roles), 15)
+        self.assertEqual(roles.count('creator'), 1)
+        self.assertEqual(roles.count('admin'), 1)
+        self.assertEqual(roles.count('member'), 13)
+        self.assertContains(response, 'Creator', count=1)
+        self.assertContains(response, 'Administrator', count=1)
+
+    def test_import_non_ascii_usernames(self):
+        import os
+        import tempfile
+        from StringIO import StringIO
+        from django.core.management import call_command
+        user = User.objects.create(username=u'jos\xe9')
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        try:
+            with os.fdopen(handle, 'wb') as csv_file:
+                csv_file.write(u'jos\xe9\nnobody\n'.encode('utf-8'))
+            stdout, stderr = StringIO(), StringIO()
+            call_command('import_group_members', self.group.slug, path, stdout=stdout, stderr=stderr)
+        finally:
+            os.remove(path)
+        self.assertTrue(self.group.has_member(user))
+        self.assertNotIn('jos', stderr.getvalue())
+        self.assertIn('nobody', stderr.getvalue())
+
+    def test_administrator_edges(self):
+        from social_network.models import SocialGroup
+        admin1, admin2 = self.members[:2]
+        self.group.administrators.add(admin1, admin2)
+        self.assertEqual(self.group.relationship_with(admin1)[1], 'admin')
+        self.assertTrue(self.group.has_admin(admin2))
+        self.group.administrators.remove(admin2)
+        self.assertFalse(self.group.has_member(User.objects.get(pk=admin2.pk)))
+        self.group.administrators.clear()
+        self.assertFalse(self.group.has_member(User.objects.get(pk=admin1.pk)))
+        self.assertFalse(self.group.has_admin(admin1))
+        other = SocialGroup.objects.create(creator=self.creator, name='Chess Club', description='Chess')
+        admin1.managed_groups.add(self.group, other)
+        self.assertEqual(other.relationship_with(admin1)[1], 'admin')
+        admin1.managed_groups.clear()
+        self.assertEqual(other.relationship_with(admin1)[1], None)
+        # the creator keeps their role
+        self.group.administrators.add(self.creator)
+        self.assertEqual(self.group.relationship_with(self.creator)[1], 'creator')
+
+    def test_slugs(self):
+        from social_network.models import SocialGroup
+        from social_network.utils import unique_slug
+        self.assertEqual(self.group.slug, 'book-club')
+        slugs = [SocialGroup.objects.create(creator=self.creator, name=name, description='Books').slug
+                 for name in ('Book Club', 'Book Club', 'Book Clubs')]
+        self.assertEqual(slugs, ['book-club-2', 'book-club-3', 'book-clubs'])
+        self.assertEqual(unique_slug('club', ['club', 'club-9', 'club-x', 'clubs'], 255), 'club-10')
+        self.assertEqual(unique_slug('club', ['club'], 5), 'clu-2')
+
+
+class CounterTest(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user1 = User.objects.create(username='follower')
+        self.user2 = User.objects.create(username='followed')
+
+    def test_counters_follow_signals(self):
+        self.assertEqual(self.user2.followers(), 0)
+        self.assertEqual(self.user1.following(), 0)
+        self.user1.follow(self.user2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.user2.followers(), 1)
+            self.assertEqual(self.user1.following(), 1)
+        self.user1.stop_following(self.user2)
+        self.assertEqual(self.user2.followers(), 0)
+        self.user1.make_friend_of(self.user2)
+        self.assertEqual(self.user1.friends(), 1)
+        self.assertEqual(self.user2.friends(), 1)
+
+    def test_repeated_relationships(self):
+        from social_network.models import SocialGroup
+        group = SocialGroup.objects.create(creator=self.user2, name='Repeated', description='Repeated')
+        for i in range(2):
+            self.user1.follow(self.user2)
+            self.user1.make_friend_of(self.user2)
+            self.user1.join(group)
+            group.add_member(self.user2)
+        self.assertEqual(self.user2.followers(), 1)
+        self.assertEqual(self.user1.following(), 1)
+        self.assertEqual(self.user1.friends(), 1)
+        self.assertEqual(group.members, 2)
+        self.assertEqual(self.user1.social_groups(), 1)
+        self.assertEqual(group.relationship_with(self.user2)[1], 'creator')
+
+    def test_update_while_computing(self):
+        from social_network.counters import FOLLOWERS, get_counter, update_counter
+        site_id = self.user2.get_site().pk
+
+        def compute():
+            # a follow landing between the count and the cache write
+            update_counter(self.user2, FOLLOWERS, site_id, 1)
+            return 0
+        self.assertEqual(get_counter(self.user2, FOLLOWERS, site_id, compute), 0)
+        self.assertEqual(get_counter(self.user2, FOLLOWERS, site_id, lambda: 1), 1)
+
+    def test_toggle_follow(self):
+        self.assertEqual(self.user1.toggle_follow(self.user2), (True, 1))
+        self.assertTrue(self.user2.followed_by(self.user1))
+        self.assertEqual(self.user1.toggle_follow(self.user2), (False, 0))
+        self.assertFalse(self.user2.followed_by(self.user1))
+
+    def test_coalesced_toggles(self):
+        from social_network import dispatch, follows, tasks
+        scheduled = []
+        apply_async = tasks.apply_follow_toggles.apply_async
+        tasks.apply_follow_toggles.apply_async = lambda args, countdown: scheduled.append(args)
+        window, follows.FOLLOW_COALESCE_WINDOW = follows.FOLLOW_COALESCE_WINDOW, 5
+        eager, dispatch.ASYNC_SIGNALS_EAGER = dispatch.ASYNC_SIGNALS_EAGER, False
+        try:
+            self.assertEqual(follows.coalesced_toggle(self.user1, self.user2), (True, 1))
+            self.assertEqual(follows.coalesced_toggle(self.user1, self.user2), (False, 0))
+            self.assertEqual(follows.coalesced_toggle(self.user1, self.user2), (True, 1))
+            self.assertEqual(len(scheduled), 1)
+            self.assertFalse(self.user2.followed_by(self.user1))
+            follows.apply_pending_toggles(*scheduled[0])
+            self.assertTrue(self.user2.followed_by(self.user1))
+            self.assertEqual(self.user2.followers(), 1)
+            # a new window, decided from the actual relationship
+            self.assertEqual(follows.coalesced_toggle(self.user1, self.user2), (False, 0))
+            self.assertEqual(len(scheduled), 2)
+            follows.apply_pending_toggles(*scheduled[1])
+            self.assertFalse(self.user2.followed_by(self.user1))
+            # applying twice writes nothing
+            follows.apply_pending_toggles(*scheduled[1])
+            self.assertFalse(self.user2.followed_by(self.user1))
+            # in eager mode the task runs right away
+            dispatch.ASYNC_SIGNALS_EAGER = True
+            self.assertEqual(follows.coalesced_toggle(self.user1, self.user2), (True, 1))
+            self.assertTrue(self.user2.followed_by(self.user1))
+            self.assertEqual(len(scheduled), 2)
+        finally:
+            tasks.apply_follow_toggles.apply_async = apply_async
+            follows.FOLLOW_COALESCE_WINDOW = window
+            dispatch.ASYNC_SIGNALS_EAGER = eager
+
+
+class GroupFeedTest(TestCase):
+
+    def setUp(self):
+        from social_network.models import SocialGroup, GroupPost
+        self.user = User.objects.create(username='reader')
+        self.groups = [
+            SocialGroup.objects.create(creator=self.user, name='Group %s' % i, description='Group') for i in range(3)
+        ]
+        self.posts = []
+        for i in range(6):
+            self.posts.append(GroupPost.objects.create(
+                creator=self.user, group=self.groups[i % 3], comment='Post %s' % i
+            ))
+
+    def test_merged_group_feed(self):
+        seen = []
+        cursor = None
+        while True:
+            items, cursor = self.user.group_feed(cursor, 4)
+            seen.extend(items)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), len(self.posts))
+        self.assertEqual([item.date for item in seen], sorted([item.date for item in seen], reverse=True))
+
+    def test_for_display(self):
+        with self.assertNumQueries(2):
+            items, cursor = self.groups[0].feed_items.all().for_display().page()
+            self.assertEqual(len(items), 2)
+            for item in items:
+                self.assertEqual(item.url, self.groups[0].get_absolute_url())
+                self.assertFalse(item.picture)
+                item.event.user, item.template_config
+        self.user.is_member_of(self.groups[0])
+        # heads, one timeline per group, targets
+        with self.assertNumQueries(5):
+            items, cursor = self.user.group_feed()
+            for item in items:
+                item.url, item.event.user, item.group
+        self.assertEqual(len(items), len(self.posts))
+
+    def test_post_fragment_version(self):
+        from social_network.fragments import post_version
+        post = self.posts[0]
+        version = post_version(post.pk)
+        self.assertEqual(post_version(post.pk), version)
+        post.comment = 'Edited'
+        post.save()
+        self.assertNotEqual(post_version(post.pk), version)
+
+    def test_post_without_feed_item(self):
+        from django.template.loader import render_to_string
+        html = render_to_string('social_network/group/detail/post.html', {'item': None, 'user': self.user})
+        self.assertIn('Place your content here...', html)
+        self.assertNotIn('Edit', html)
+
+    def test_post_edit_and_delete(self):
+        from social_network.models import GroupFeedItem, GroupPost
+        post = GroupPost.objects.get(pk=self.posts[0].pk)
+        feed_item = post.feed_item
+        self.assertEqual(feed_item.event.target_pk, str(post.pk))
+        post.comment = 'Edited'
+        with self.assertNumQueries(3):
+            post.save()
+        self.assertTrue(GroupFeedItem.objects.get(pk=feed_item.pk).date > feed_item.date)
+        post.delete()
+        erased = GroupFeedItem.historical.get(pk=feed_item.pk)
+        self.assertTrue(erased.erased)
+        self.assertIsNone(erased.post_id)
+
+    def test_newest_post_deleted_and_replaced(self):
+        from social_network.models import GroupFeedItem, GroupPost
+        newest = self.posts[-1]
+        newest.delete()
+        post = GroupPost.objects.create(creator=self.user, group=newest.group, comment='Replacement')
+        feed_item = GroupPost.objects.get(pk=post.pk).feed_item
+        self.assertFalse(feed_item.erased)
+        self.assertEqual(feed_item.event.target_pk, str(post.pk))
+        self.assertEqual(GroupFeedItem.objects.filter(group=newest.group).count(), 2)
+
+
+class FriendsTest(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(username='friend%s' % i) for i in range(5)]
+        # 0 - 1, 0 - 2, 1 - 3, 2 - 3, 2 - 4
+        for i, j in ((0, 1), (0, 2), (1, 3), (2, 3), (2, 4)):
+            self.users[i].make_friend_of(self.users[j])
+
+    def test_intersect(self):
+        from array import array
+        from social_network.friends import intersect
+        self.assertEqual(list(intersect(array('l', [1, 3, 5, 7]), array('l', [3, 4, 5]))), [3, 5])
+        self.assertEqual(list(intersect(array('l', [40]), array('l', range(100)))), [40])
+
+    def test_mutual_friends_and_suggestions(self):
+        self.assertEqual(list(self.users[0].mutual_friends(self.users[3])), [self.users[1], self.users[2]])
+        self.assertEqual(self.users[0].mutual_friend_count(self.users[4]), 1)
+        self.assertEqual(self.users[0].friend_suggestions(), [(self.users[3], 2), (self.users[4], 1)])
+
+    def test_suggestion_caps(self):
+        from social_network.friends import friend_adjacency
+        ids, adjacency = friend_adjacency(self.users[2], max_per_friend=1)
+        self.assertEqual(sorted(adjacency.keys()), [self.users[0].pk, self.users[3].pk, self.users[4].pk])
+        self.assertTrue(all(len(neighbours) == 1 for neighbours in adjacency.values()))
+        ids, adjacency = friend_adjacency(self.users[2], max_edges=1)
+        self.assertEqual(len(adjacency), 1)
+        # friends left out of the ones read are still not suggested
+        self.users[1].make_friend_of(self.users[2])
+        suggested = [user for user, count in self.users[0].friend_suggestions(max_friends=1)]
+        self.assertTrue(suggested)
+        self.assertNotIn(self.users[1], suggested)
+        self.assertNotIn(self.users[2], suggested)
+
+
+class IdentityMapTest(TestCase):
+
+    def test_tags_resolve_users_once_per_request(self):
+        from django.http import HttpRequest, HttpResponse
+        from social_network.middleware import IdentityMapMiddleware
+        from social_network.templatetags.social_network_tags import process_user_param
+        user = User.objects.create(username='mapped')
+        middleware = IdentityMapMiddleware()
+        request = HttpRequest()
+        middleware.process_request(request)
+        with self.assertNumQueries(2):
+            self.assertEqual(process_user_param('mapped'), user)
+            self.assertEqual(process_user_param('mapped'), user)
+            self.assertFalse(process_user_param('missing'))
+            self.assertFalse(process_user_param('missing'))
+        self.assertEqual(request.social_identity_map.hits, 2)
+        self.assertEqual(request.social_identity_map.misses, 2)
+        middleware.process_response(request, HttpResponse())
+        with self.assertNumQueries(1):
+            process_user_param('mapped')
+
+
+class AsyncDispatchTest(TestCase):
+
+    def setUp(self):
+        from social_network import dispatch
+        self.dispatch = dispatch
+        self.settings_backup = dispatch.ASYNC_SIGNALS, dispatch.ASYNC_SIGNALS_EAGER
+        dispatch.ASYNC_SIGNALS, dispatch.ASYNC_SIGNALS_EAGER = True, True
+
+    def tearDown(self):
+        self.dispatch.ASYNC_SIGNALS, self.dispatch.ASYNC_SIGNALS_EAGER = self.settings_backup
+
+    def test_eager_dispatch_serializes_by_pk(self):
+        from social_network.signals import follower_relationship_created
+        received = []
+
+        def on_follow(sender, followed, user, **kwargs):
+            received.append((sender, followed, user))
+
+        follower_relationship_created.connect(on_follow)
+        try:
+            user = User.objects.create(username='async_follower')
+            followed = User.objects.create(username='async_followed')
+            self.assertTrue(user.follow(followed))
+        finally:
+            follower_relationship_created.disconnect(on_follow)
+        self.assertEqual(received, [(User, followed, user)])
+        # loaded back from the database in the task, not the sent instances
+        self.assertIsNot(received[0][2], user)
+        # counters are bookkeeping, updated before the signal is queued
+        self.assertEqual(followed.followers(), 1)
+        self.assertEqual(user.following(), 1)
+
+    def test_tasks_queued_after_commit(self):
+        from django.db import connection
+        from social_network import tasks
+        hooks, queued = [], []
+        apply_async = tasks.dispatch_signal.apply_async
+        tasks.dispatch_signal.apply_async = lambda args, **options: queued.append((args, options))
+        connection.on_commit = hooks.append
+        self.dispatch.ASYNC_SIGNALS_EAGER = False
+        try:
+            user = User.objects.create(username='committed_follower')
+            followed = User.objects.create(username='committed_followed')
+            user.follow(followed)
+            self.assertEqual(queued, [])
+            for hook in hooks:
+                hook()
+        finally:
+            del connection.on_commit
+            tasks.dispatch_signal.apply_async = apply_async
+        self.assertEqual(len(queued), 1)
+        self.assertEqual(queued[0][0][0], 'follower_relationship_created')
+        self.assertTrue(queued[0][1]['queue'].startswith('social_network.signals.'))
+
+    def test_ordering_key(self):
+        from social_network.models import SocialGroup
+        user = User.objects.create(username='keyed')
+        group = SocialGroup.objects.create(creator=user, name='Keyed Group', description='Keyed')
+        self.assertEqual(self.dispatch.ordering_key({'user': user, 'followed': user}), 'user:%s' % user.pk)
+        self.assertEqual(self.dispatch.ordering_key({'user': user, 'group': group}), 'group:%s' % group.pk)
+
+
+class ImageDerivativesTest(TestCase):
+
+    def setUp(self):
+        from social_network import derivatives
+        self.derivatives = derivatives
+        self.enabled, derivatives.GENERATE_DERIVATIVES = derivatives.GENERATE_DERIVATIVES, True
+
+    def tearDown(self):
+        self.derivatives.GENERATE_DERIVATIVES = self.enabled
+
+    def test_off(self):
+        self.derivatives.GENERATE_DERIVATIVES = False
+
+        class Image(object):
+            name = 'photo.png'
+            url = '/media/photo.png'
+            storage = None  # not to be touched
+        queued = []
+        queue_derivatives, self.derivatives.queue_derivatives = self.derivatives.queue_derivatives, queued.append
+        try:
+            self.derivatives.ensure_derivatives(Image())
+            self.assertEqual(self.derivatives.derivative_url(Image(), 'thumb'), '/media/photo.png')
+        finally:
+            self.derivatives.queue_derivatives = queue_derivatives
+        self.assertEqual(queued, [])
+
+    def test_derivative_names(self):
+        from social_network.derivatives import derivative_name
+        self.assertEqual(derivative_name('site-1/groups/2/abc/photo.PNG', 'thumb'),
+                         'site-1/groups/2/abc/derivatives/photo_thumb.jpg')
+        self.assertEqual(derivative_name('photo.jpeg', 'medium_webp'), 'derivatives/photo_medium_webp.webp')
+
+    def test_no_image(self):
+        from social_network.models import SocialGroup
+        user = User.objects.create(username='imageless')
+        group = SocialGroup.objects.create(creator=user, name='No Image', description='None')
+        self.assertIsNone(group.image_thumb_url)
+
+    def test_failed_variants(self):
+        import shutil
+        import tempfile
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+        from social_network import derivatives
+        if derivatives.Image is None:
+            return
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        try:
+            name = storage.save('broken.png', ContentFile(b'not really a png'))
+            derivatives.generate_derivatives(name, storage)
+            image = storage.open(name)
+            image.name, image.storage = name, storage
+            queued = []
+            queue_derivatives, derivatives.queue_derivatives = derivatives.queue_derivatives, queued.append
+            try:
+                derivatives.ensure_derivatives(image)
+                self.assertEqual(derivatives.derivative_url(image, 'thumb'), storage.url(name))
+            finally:
+                derivatives.queue_derivatives = queue_derivatives
+            self.assertEqual(queued, [])
+        finally:
+            shutil.rmtree(storage.location)
+
+    def test_without_pil(self):
+        from social_network import derivatives
+
+        class Image(object):
+            name = 'photo.png'
+            url = '/media/photo.png'
+            storage = None  # not to be touched
+        supported, derivatives._supported = derivatives._supported, []
+        try:
+            self.assertEqual(derivatives.derivative_url(Image(), 'thumb'), '/media/photo.png')
+        finally:
+            derivatives._supported = supported
+
+
+class SharedImageTest(TestCase):
+
+    def setUp(self):
+        from social_network import dispatch
+        self.dispatch = dispatch
+        self.eager, dispatch.ASYNC_SIGNALS_EAGER = dispatch.ASYNC_SIGNALS_EAGER, True
+
+    def tearDown(self):
+        self.dispatch.ASYNC_SIGNALS_EAGER = self.eager
+
+    def test_content_addressed(self):
+        import shutil
+        import tempfile
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+        from social_network.models import GroupPost, SocialGroup
+        from social_network.shared_images import release_shared_image, store_shared_image
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        try:
+            picture = ContentFile(b'not really a png', name='picture.PNG')
+            name = store_shared_image(picture, storage)
+            self.assertTrue(name.startswith('shared/') and name.endswith('.png'))
+            self.assertEqual(store_shared_image(ContentFile(b'not really a png', name='copy.png'), storage), name)
+            self.assertEqual(len(storage.listdir(name.rsplit('/', 1)[0])[1]), 1)
+
+            user = User.objects.create(username='sharer')
+            group = SocialGroup.objects.create(creator=user, name='Pictures', description='Pictures')
+            posts = [GroupPost.objects.create(creator=user, group=group, comment='Shared', image=name) for i in range(2)]
+            posts[0].delete()
+            release_shared_image(name, GroupPost, storage)
+            self.assertTrue(storage.exists(name))
+            GroupPost.objects.filter(pk=posts[1].pk).delete()
+            release_shared_image(name, GroupPost, storage)
+            self.assertFalse(storage.exists(name))
+        finally:
+            shutil.rmtree(storage.location)
+
+    def test_share_to_groups(self):
+        from social_network.models import GroupFeedItem, GroupPost, SocialGroup
+        user = User.objects.create(username='multisharer')
+        groups = [SocialGroup.objects.create(creator=user, name='Shared %s' % i, description='Shared') for i in range(3)]
+        from social_network.signals import social_group_post_created
+        created = []
+
+        def on_created(instance, bulk=False, **kwargs):
+            created.append((instance.pk, bulk))
+        social_group_post_created.connect(on_created, sender=GroupPost)
+        try:
+            posts = GroupPost.objects.share(user, [group.pk for group in groups], 'Look at this')
+            # a second (double submitted) share gets its own batch
+            again = GroupPost.objects.share(user, [group.pk for group in groups], 'Look at this')
+        finally:
+            social_group_post_created.disconnect(on_created, sender=GroupPost)
+        self.assertEqual(sorted(post.group_id for post in posts), sorted(group.pk for group in groups))
+        self.assertFalse(set(post.pk for post in posts) & set(post.pk for post in again))
+        self.assertEqual(sorted(created), sorted((post.pk, True) for post in posts + again))
+        for post in posts + again:
+            item = GroupFeedItem.objects.get(post=post.pk)
+            self.assertEqual(item.group_id, post.group_id)
+            self.assertEqual(item.event.target_pk, str(post.pk))
+
+
+class EmbedTest(TestCase):
+
+    def test_providers(self):
+        from social_network.embeds import EmbedResolver, LRUCache, render_url, resolver
+        self.assertIn('youtube.com/embed/dQw4w9WgXcQ', render_url('https://www.youtube.com/watch?v=dQw4w9WgXcQ'))
+        self.assertIn('player.vimeo.com/video/76979871', render_url('https://vimeo.com/76979871'))
+        self.assertTrue(render_url('http://example.com/a.JPG?size=large').startswith('<img'))
+        self.assertTrue(render_url('http://example.com/clip.mp4').startswith('<video'))
+        self.assertTrue(render_url('http://example.com/?q=<b>').startswith('<a rel="nofollow" href="http://example.com/?q=&lt;b&gt;"'))
+        broken = EmbedResolver()
+        broken.register(lambda url: 1 / 0)
+        broken.register(lambda url: '<b>%s</b>' % url)
+        self.assertEqual(broken.resolve('http://example.com/'), '<b>http://example.com/</b>')
+        custom = EmbedResolver(cache_size=2)
+        for provider in resolver.providers:
+            custom.register(provider)
+        custom.register(lambda url: '<b>%s</b>' % url if 'example.com' in url else None)
+        self.assertEqual(custom.resolve('http://example.com/'), '<b>http://example.com/</b>')
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(list(lru.items.keys()), ['a', 'c'])
+
+
+FETCHED = []
+
+
+def stub_fetcher(url):
+    FETCHED.append(url)
+    return (u'<html><head><title>Fallback</title><meta property="og:title" content="Example &amp; co">'
+            u'<meta property="og:image" content="/cover.png"><meta name="description" content="A page"></head></html>')
+
+
+class LinkPreviewTest(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from social_network import dispatch
+        cache.clear()
+        from social_network import previews
+        del FETCHED[:]
+        self.dispatch, self.previews = dispatch, previews
+        self.eager, dispatch.ASYNC_SIGNALS_EAGER = dispatch.ASYNC_SIGNALS_EAGER, True
+        self.enabled, previews.LINK_PREVIEWS = previews.LINK_PREVIEWS, True
+
+    def tearDown(self):
+        self.dispatch.ASYNC_SIGNALS_EAGER = self.eager
+        self.previews.LINK_PREVIEWS = self.enabled
+
+    def test_previews_off(self):
+        from django.test.utils import override_settings
+        from social_network.models import GroupPost, SocialGroup
+        self.previews.LINK_PREVIEWS = False
+        user = User.objects.create(username='unpreviewed')
+        group = SocialGroup.objects.create(creator=user, name='No previews', description='None')
+        with override_settings(SOCIAL_NETWORK_PREVIEW_FETCHER='social_network.tests.tests.stub_fetcher'):
+            post = GroupPost.objects.create(creator=user, group=group, comment='Look', url='http://example.com/page')
+        self.assertEqual(FETCHED, [])
+        self.assertFalse(GroupPost.objects.get(pk=post.pk).has_preview)
+
+    def test_normalize_url(self):
+        from social_network.previews import normalize_url
+        self.assertEqual(normalize_url('HTTP://Example.com:80/a?utm_source=feed&b=2&a=1#top'), 'http://example.com/a?a=1&b=2')
+
+    def test_internal_urls_are_not_fetched(self):
+        from social_network.previews import check_url, is_public_address
+        for url in ('file:///etc/passwd', 'ftp://example.com/', 'http://127.0.0.1:8000/', 'http://169.254.169.254/',
+                    'http://10.0.0.1/', 'http://[::1]/'):
+            self.assertRaises(ValueError, check_url, url)
+        self.assertTrue(is_public_address('93.184.216.34'))
+        self.assertFalse(is_public_address('192.168.1.1'))
+        self.assertFalse(is_public_address('::ffff:127.0.0.1'))
+        self.assertFalse(is_public_address('fd00::1'))
+
+    def test_fetcher_connects_to_the_checked_address(self):
+        import socket
+        import urllib2
+        from social_network import previews
+        lookups, connections = [], []
+
+        def rebinding_resolve(host, port):
+            lookups.append(host)
+            return ['93.184.216.34'] if len(lookups) == 1 else ['127.0.0.1']
+
+        def create_connection(address, *args, **kwargs):
+            connections.append(address)
+            raise socket.error("No network in tests.")
+        resolve, previews.resolve = previews.resolve, rebinding_resolve
+        connect, socket.create_connection = socket.create_connection, create_connection
+        try:
+            self.assertRaises(urllib2.URLError, previews.urllib_fetcher, 'http://rebinding.example.com/')
+        finally:
+            previews.resolve = resolve
+            socket.create_connection = connect
+        self.assertEqual(lookups, ['rebinding.example.com'])
+        self.assertEqual(connections, [('93.184.216.34', 80)])
+
+    def test_preview_stored_on_post(self):
+        from django.test.utils import override_settings
+        from social_network.models import GroupPost, SocialGroup
+        user = User.objects.create(username='sharer')
+        group = SocialGroup.objects.create(creator=user, name='Links', description='Links')
+        with override_settings(SOCIAL_NETWORK_PREVIEW_FETCHER='social_network.tests.tests.stub_fetcher'):
+            first = GroupPost.objects.create(creator=user, group=group, comment='Look', url='http://example.com/page')
+            second = GroupPost.objects.create(creator=user, group=group, comment='Again',
+                                              url='http://EXAMPLE.com/page?utm_campaign=x')
+        self.assertEqual(FETCHED, ['http://example.com/page'])
+        for post in (first, second):
+            post = GroupPost.objects.get(pk=post.pk)
+            self.assertTrue(post.has_preview)
+            self.assertEqual(post.preview_title, u'Example & co')
+            self.assertEqual(post.preview_image, 'http://example.com/cover.png')
+            self.assertEqual(post.preview_description, 'A page')
@@ -1,6 +1,7 @@
 # coding=utf-8
+from django.contrib.contenttypes.models import ContentType
 from notifications.transports import BaseTransport
-from models import GroupFeedItem, SocialGroup
+from models import GroupFeedItem, GroupPost, SocialGroup
 
 
 class GroupFeedTransport(BaseTransport):
@@ -10,7 +11,9 @@ class GroupFeedTransport(BaseTransport):
         if group is None or not isinstance(group, SocialGroup) or event is None or template is None:
             return
         try:
-            feed_item = GroupFeedItem(group=group, event=event, template_config=template)
+            feed_item = GroupFeedItem(group=group, event=event, template_config=template, date=event.date)
+            if event.target_type_id == ContentType.objects.get_for_model(GroupPost).pk:
+                feed_item.post_id = int(event.target_pk)
             feed_item.save()
         except:
             pass  # TODO Log
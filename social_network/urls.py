@@ -23,6 +23,12 @@ relationship_patterns = patterns(
         name='deny_friend_request'
     ),
 
+    url(
+        r'^group_feed/$',
+        lr(views.UserGroupFeedView.as_view()),
+        name='group_feed'
+    ),
+
     url(
         r'^(?P<username>\w+)/toggle_follow/$',
         lr(views.FollowerRelationshipToggleView.as_view()),
@@ -1,92 +1,128 @@
 # coding=utf-8
+import datetime
+import logging
 import random
-from django.core.cache import cache
-from django.core.exceptions import ObjectDoesNotExist
+import time
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.translation import ugettext as _
 from notifications.models import EventType
 from social_graph import EdgeType
+from . import SOCIAL_GROUP_POST_EVENT_TYPE_NAME
 
 try:
     from hashlib import sha1 as sha_constructor, md5 as md5_constructor
 except ImportError:
     pass
 
+logger = logging.getLogger(__name__)
+
+# seconds the registry keeps the type rows, and a missing type, before looking them up again
+TYPE_REGISTRY_TIMEOUT = getattr(settings, 'SOCIAL_NETWORK_TYPE_REGISTRY_TIMEOUT', 60 * 10)
+TYPE_REGISTRY_MISS_TIMEOUT = getattr(settings, 'SOCIAL_NETWORK_TYPE_REGISTRY_MISS_TIMEOUT', 10)
+
+
+# ---------------------REGISTRY--------------------------------------
+class TypeRegistry(object):
+    """
+    Process-local registry for the EdgeType/EventType rows this app relies on.
+
+    Rows are loaded with a single query the first time any of them is requested and then served from memory for
+    ``timeout`` seconds. A missing row is logged and looked up again after ``miss_timeout`` seconds, so processes
+    started before the rows were created recover. Call ``invalidate`` whenever the rows may have changed (see
+    ``social_network.management``).
+    """
+
+    def __init__(self, model, names, timeout=TYPE_REGISTRY_TIMEOUT, miss_timeout=TYPE_REGISTRY_MISS_TIMEOUT):
+        self.model = model
+        self.names = tuple(names)
+        self.timeout = timeout
+        self.miss_timeout = miss_timeout
+        self.invalidate()
+
+    def load(self):
+        rows = dict((row.name, row) for row in self.model.objects.filter(name__in=self.names))
+        self._rows = rows
+        self._expires = time.time() + self.timeout
+        self._missing = {}
+        return rows
+
+    def get(self, name):
+        rows = self._rows
+        now = time.time()
+        if rows is None or now >= self._expires or name not in rows and now >= self._missing.get(name, 0):
+            rows = self.load()
+            if name not in rows:
+                self._missing[name] = now + self.miss_timeout
+                logger.warning("%s '%s' does not exist.", self.model.__name__, name)
+        return rows.get(name)
+
+    def invalidate(self):
+        self._rows = None
+        self._expires = 0
+        self._missing = {}
+
+
+edge_types = TypeRegistry(EdgeType, ('Friendship', 'Integrated by', 'Member', 'Follower', 'Followed by'))
+event_types = TypeRegistry(EventType, (SOCIAL_GROUP_POST_EVENT_TYPE_NAME,))
+
 
 # ---------------------NOTIFICATIONS---------------------------------
 def group_post_event_type():
-    post_event_type = cache.get('SOCIAL_NETWORK_POST_EVENT_TYPE')
-    if post_event_type is not None:
-        return post_event_type
-    try:
-        from . import SOCIAL_GROUP_POST_EVENT_TYPE_NAME
-        post_event_type = EventType.objects.get(name=SOCIAL_GROUP_POST_EVENT_TYPE_NAME)
-        cache.set('SOCIAL_NETWORK_POST_EVENT_TYPE', post_event_type)
-        return post_event_type
-    except ObjectDoesNotExist as e:
-        pass  # TODO Log this
+    return event_types.get(SOCIAL_GROUP_POST_EVENT_TYPE_NAME)
 
 
 # ---------------------EDGES-----------------------------------------
 def friendship_edge():
-    _friendship = cache.get('FRIENDSHIP_EDGE_TYPE')
-    if _friendship is not None:
-        return _friendship
-    try:
-        _friendship = EdgeType.objects.get(name="Friendship")
-        cache.set('FRIENDSHIP_EDGE_TYPE', _friendship)
-        return _friendship
-    except ObjectDoesNotExist as e:
-        pass  # TODO Log this
+    return edge_types.get("Friendship")
 
 
 def integrated_by_edge():
-    _integrated_by = cache.get('INTEGRATED_BY_EDGE_TYPE')
-    if _integrated_by is not None:
-        return _integrated_by
-    try:
-        _integrated_by = EdgeType.objects.get(name="Integrated by")
-        cache.set('INTEGRATED_BY_EDGE_TYPE', _integrated_by)
-        return _integrated_by
-    except ObjectDoesNotExist as e:
-        pass  # TODO Log this
+    return edge_types.get("Integrated by")
 
 
 def member_of_edge():
-    _member_of = cache.get('MEMBER_OF_EDGE_TYPE')
-    if _member_of is not None:
-        return _member_of
-    try:
-        _member_of = EdgeType.objects.get(name="Member")
-        cache.set('MEMBER_OF_EDGE_TYPE', _member_of)
-        return _member_of
-    except ObjectDoesNotExist as e:
-        pass  # TODO Log this
+    return edge_types.get("Member")
 
 
 def follower_of_edge():
-    _follower_of = cache.get('FOLLOWER_OF_EDGE_TYPE')
-    if _follower_of is not None:
-        return _follower_of
-    try:
-        _follower_of = EdgeType.objects.get(name="Follower")
-        cache.set('FOLLOWER_OF_EDGE_TYPE', _follower_of)
-        return _follower_of
-    except ObjectDoesNotExist:
-        pass
+    return edge_types.get("Follower")
 
 
 def followed_by_edge():
-    _followed_by = cache.get('FOLLOWED_BY_EDGE_TYPE')
-    if _followed_by is not None:
-        return _followed_by
-    try:
-        _followed_by = EdgeType.objects.get(name="Followed by")
-        cache.set('FOLLOWED_BY_EDGE_TYPE', _followed_by)
-        return _followed_by
-    except ObjectDoesNotExist:
-        pass
+    return edge_types.get("Followed by")
 
 # ---------------------GENERAL-----------------------------------------
+CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def encode_cursor(cursor):
+    """
+    Serializes a (datetime, pk) pagination cursor so it can travel in a query string.
+    """
+    if cursor is None:
+        return ''
+    time, pk = cursor
+    if timezone.is_aware(time):
+        time = timezone.make_naive(time, timezone.utc)
+    return '%s.%s' % (time.strftime(CURSOR_TIME_FORMAT), pk)
+
+
+def decode_cursor(value):
+    """
+    Parses a cursor serialized by encode_cursor. Returns None if value isn't a valid cursor.
+    """
+    try:
+        time, pk = value.split('.')
+        time = datetime.datetime.strptime(time, CURSOR_TIME_FORMAT)
+        pk = int(pk)
+    except (AttributeError, ValueError):
+        return None
+    if settings.USE_TZ:
+        time = timezone.make_aware(time, timezone.utc)
+    return time, pk
+
 
 
 def generate_sha1(string, salt=None):
@@ -123,6 +159,52 @@ intword_converters = (
 )
 
 
+def keyset_page(queryset, field, cursor=None, limit=20):
+    """
+    Keyset pagination over a queryset, newest first, using (field, pk) as key, field being a datetime.
+
+    The cost of a page doesn't depend on how many rows come before it. Returns a tuple with the list of objects and
+    the cursor to pass in order to get the next page (None if this is the last one).
+    """
+    queryset = queryset.order_by('-%s' % field, '-pk')
+    if cursor is not None:
+        time, pk = cursor
+        queryset = queryset.filter(Q(**{'%s__lt' % field: time}) | Q(**{field: time, 'pk__lt': pk}))
+    objects = list(queryset[:limit + 1])
+    if len(objects) <= limit:
+        return objects, None
+    objects = objects[:limit]
+    return objects, (getattr(objects[-1], field), objects[-1].pk)
+
+
+def chunks(iterable, size):
+    """
+    Splits any iterable in lists of at most size items, consuming it lazily.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def unique_slug(base, taken, max_length):
+    """
+    Returns base if it isn't in taken, else base suffixed with the next free number (base-2, base-3...), the
+    suffix following the greatest one in use.
+    """
+    taken = set(taken)
+    if base not in taken:
+        return base
+    prefix = base + '-'
+    suffixes = [int(slug[len(prefix):]) for slug in taken if slug.startswith(prefix) and slug[len(prefix):].isdigit()]
+    suffix = '-%s' % (max(suffixes + [1]) + 1)
+    return base[:max_length - len(suffix)] + suffix
+
+
 def intmin(value):
     """
     """
@@ -11,8 +11,9 @@ from django.utils.encoding import force_text
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic import CreateView, ListView, View, DetailView, TemplateView, UpdateView, FormView, DeleteView
 from . import SERVER_SUCCESS_MESSAGE
-from utils import intmin
-from models import SocialGroup, GroupMembershipRequest, GroupPost
+from utils import intmin, encode_cursor, decode_cursor
+from models import SocialGroup, GroupMembershipRequest, GroupPost, GroupFeedItem
+from relationships import RelationshipResolver
 from forms import (
     FriendRequestForm,
     SocialGroupForm,
@@ -135,8 +136,12 @@ class FriendshipButtonsTemplateView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super(FriendshipButtonsTemplateView, self).get_context_data(**kwargs)
+        target_user = User.objects.get(username=self.kwargs['username'])
+        if self.request.user.is_authenticated():
+            # the buttons filters read the prefetched state instead of one query each
+            RelationshipResolver(self.request.user, [target_user]).attach()
         context.update({
-            'target_user': User.objects.get(username=self.kwargs['username'])
+            'target_user': target_user
         })
         return context
 
@@ -147,16 +152,8 @@ class FollowerRelationshipToggleView(JSONResponseEnabledMixin, View):
         try:
             user = User.objects.get(username=kwargs['username'])
 
-            if user.followed_by(request.user):
-                request.user.stop_following(user)
-                tooltip = _(u"Follow")
-                toggle_status = False
-            else:
-                request.user.follow(user)
-                tooltip = _(u"Stop Following")
-                toggle_status = True
-
-            followers = user.followers()
+            toggle_status, followers = request.user.toggle_follow(user)
+            tooltip = _(u"Stop Following") if toggle_status else _(u"Follow")
 
             return self.render_to_json({
                 'result': True,
@@ -401,7 +398,7 @@ class GenericGroupPostCreateView(BaseGroupPostCreateView):
 
     def form_valid(self, form):
         self.object = form.save()
-        feed_item = self.object.group.feed_items.filter(event__target_pk=self.object.pk).first()
+        feed_item = GroupFeedItem.objects.for_display().filter(post=self.object.pk).first()
         return self.response_class(
             request=self.request,
             template=self.response_template_name,
@@ -428,7 +425,7 @@ class GenericGroupPostUpdateView(UpdateView):
     @atomic
     def form_valid(self, form):
         self.object = form.save()
-        feed_item = self.object.group.feed_items.filter(event__target_pk=self.object.pk).first()
+        feed_item = GroupFeedItem.objects.for_display().filter(post=self.object.pk).first()
         return self.response_class(
             request=self.request,
             template=self.response_template_name,
@@ -492,11 +489,38 @@ class GroupPhotoCreateView(GroupPostCreateView, BaseGroupPhotoCreateView):
 
 class SocialGroupFeedView(ListView):
     template_name = 'social_network/group/detail/feed.html'
+    page_size = 20
+
+    def get_queryset(self):
+        self.group = SocialGroup.on_site.get(slug=self.kwargs.get('slug'))
+        items, self.next_cursor = self.group.feed_items.all().for_display().page(
+            decode_cursor(self.request.GET.get('cursor')), self.page_size
+        )
+        return items
+
+    def get_context_data(self, **kwargs):
+        context = super(SocialGroupFeedView, self).get_context_data(**kwargs)
+        context.update({
+            'group': self.group,
+            'next_cursor': encode_cursor(self.next_cursor)
+        })
+        return context
+
+
+class UserGroupFeedView(ListView):
+    template_name = 'social_network/group/detail/feed.html'
+    page_size = 20
 
     def get_queryset(self):
-        self.group = SocialGroup.on_site.filter(slug=self.kwargs.get('slug'))
-        self.queryset = self.group.feed_items.all()
-        return super(SocialGroupFeedView, self).get_queryset()
+        items, self.next_cursor = self.request.user.group_feed(
+            decode_cursor(self.request.GET.get('cursor')), self.page_size
+        )
+        return items
+
+    def get_context_data(self, **kwargs):
+        context = super(UserGroupFeedView, self).get_context_data(**kwargs)
+        context['next_cursor'] = encode_cursor(self.next_cursor)
+        return context
 
 
 class SocialGroupMembershipRequestsList(ListView):
@@ -518,16 +542,23 @@ class SocialGroupMembershipRequestsList(ListView):
 
 class SocialGroupMembersList(ListView):
     template_name = 'social_network/group/detail/members.html'
+    page_size = 20
 
     def get_queryset(self):
         self.group = SocialGroup.objects.get(slug=self.kwargs['slug'])
-        self.queryset = User.objects.filter(pk__in=[user.pk for user in self.group.member_list])
-        return super(SocialGroupMembersList, self).get_queryset()
+        members, self.next_cursor = self.group.member_page(
+            decode_cursor(self.request.GET.get('cursor')), self.page_size
+        )
+        # the role comes along with the membership edge, keep it for render_user_rol
+        for user, role in members:
+            user.group_role = role
+        return [user for user, role in members]
 
     def get_context_data(self, **kwargs):
         context = super(SocialGroupMembersList, self).get_context_data(**kwargs)
         context.update({
-            'group': SocialGroup.objects.get(slug=self.kwargs['slug'])
+            'group': self.group,
+            'next_cursor': encode_cursor(self.next_cursor)
         })
         return context
 